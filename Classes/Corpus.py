@@ -0,0 +1,164 @@
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+from typing import Dict, List, Optional, Tuple
+
+import networkx as nx
+
+from Classes.Musical import Musical
+
+
+def _keep_edge(w: float, weight_threshold: float) -> bool:
+    # one rule for both parts of a combined graph: cross edges only exist for
+    # candidate pairs, so zero-weight within-musical edges are dropped as well
+    return w > 0 and w >= weight_threshold
+
+
+def _cross_shard(songs_a, songs_b, candidates, min_k, jaccard_min, weight_threshold):
+    # top-level so a process pool can run one musical pair per task
+    edges = []
+    for i, j in candidates:
+        w, phrases = songs_a[i].connection_to(songs_b[j], min_k=min_k, jaccard_min=jaccard_min)
+        if _keep_edge(w, weight_threshold):
+            edges.append((i, j, w, phrases))
+    return edges
+
+
+class Corpus:
+    """
+    Several Musical instances (shows/albums) analyzed together.
+
+    - one shared vocabulary: every song gets `token_ids` into `self.vocab`
+    - one shared min_k-gram index over all songs, used to enumerate only
+      cross-musical pairs that share at least one min_k-gram (any other pair
+      has no common phrase >= min_k, so its phrase score is 0)
+    - within-musical graphs are built by each Musical and cached; cross edges
+      are computed per musical pair (a shard), optionally in a process pool
+    Nodes of combined graphs are "<label>/<song name>" with a `musical` attribute.
+    """
+    def __init__(self, musicals: Dict[str, Musical]):
+        self.musicals = dict(musicals)
+        self.vocab: Dict[str, int] = {}
+        for m in self.musicals.values():
+            for s in m.songs:
+                s.token_ids = [self.vocab.setdefault(t, len(self.vocab)) for t in s.tokens_cache]
+        self._index: Dict[int, Dict[tuple, List[Tuple[str, int]]]] = {}
+        self._candidates: Dict[int, Dict[Tuple[str, str], set]] = {}
+        self._within: Dict[tuple, nx.Graph] = {}
+        self._cross: Dict[tuple, list] = {}
+
+    @staticmethod
+    def node_id(label: str, song_name: str) -> str:
+        return f"{label}/{song_name}"
+
+    # ---------- shared index ----------
+    def _kgram_index(self, min_k: int) -> Dict[tuple, List[Tuple[str, int]]]:
+        """min_k-gram of token ids -> [(musical label, song index)] (one entry per song)."""
+        index = self._index.get(min_k)
+        if index is None:
+            index = {}
+            for label, m in self.musicals.items():
+                for idx, s in enumerate(m.songs):
+                    ids = s.token_ids
+                    grams = set(zip(*(ids[i:] for i in range(min_k))))
+                    for g in grams:
+                        index.setdefault(g, []).append((label, idx))
+            self._index[min_k] = index
+        return index
+
+    def _all_candidates(self, min_k: int) -> Dict[Tuple[str, str], set]:
+        """One pass over the shared index: (label_a, label_b) -> {(i, j)} sharing a min_k-gram."""
+        cands = self._candidates.get(min_k)
+        if cands is None:
+            rank = {label: r for r, label in enumerate(self.musicals)}
+            cands = {}
+            for postings in self._kgram_index(min_k).values():
+                by_label: Dict[str, List[int]] = {}
+                for lab, i in postings:
+                    by_label.setdefault(lab, []).append(i)
+                if len(by_label) < 2:
+                    continue
+                labels = sorted(by_label, key=rank.get)
+                for la, lb in combinations(labels, 2):
+                    bucket = cands.setdefault((la, lb), set())
+                    for i in by_label[la]:
+                        for j in by_label[lb]:
+                            bucket.add((i, j))
+            self._candidates[min_k] = cands
+        return cands
+
+    def candidate_pairs(self, label_a: str, label_b: str, min_k: int = 3) -> List[Tuple[int, int]]:
+        """Song index pairs (a in label_a, b in label_b) sharing at least one min_k-gram."""
+        cands = self._all_candidates(min_k)
+        if (label_a, label_b) in cands:
+            return sorted(cands[(label_a, label_b)])
+        return sorted((i, j) for j, i in cands.get((label_b, label_a), ()))
+
+    # ---------- edges ----------
+    def cross_edges(self, label_a: str, label_b: str, min_k: int = 3,
+                    jaccard_min: Optional[float] = None, weight_threshold: float = 0.0):
+        """Phrase edges between two musicals as [(song_a, song_b, weight, phrases)], cached per shard."""
+        key = (label_a, label_b, min_k, jaccard_min, weight_threshold)
+        if key not in self._cross:
+            A, B = self.musicals[label_a].songs, self.musicals[label_b].songs
+            raw = _cross_shard(A, B, self.candidate_pairs(label_a, label_b, min_k),
+                               min_k, jaccard_min, weight_threshold)
+            self._cross[key] = [(A[i].name, B[j].name, w, ph) for i, j, w, ph in raw]
+        return self._cross[key]
+
+    def build_cross_edges(self, min_k: int = 3, jaccard_min: Optional[float] = None,
+                          weight_threshold: float = 0.0, processes: Optional[int] = None):
+        """Fill the cross-edge cache for every musical pair, one shard per task."""
+        todo = []
+        for la, lb in combinations(self.musicals, 2):
+            if (la, lb, min_k, jaccard_min, weight_threshold) not in self._cross:
+                todo.append((la, lb, self.candidate_pairs(la, lb, min_k)))
+        if not todo:
+            return
+        if processes == 1:
+            for la, lb, _ in todo:
+                self.cross_edges(la, lb, min_k, jaccard_min, weight_threshold)
+            return
+        with ProcessPoolExecutor(max_workers=processes) as ex:
+            futs = {
+                ex.submit(_cross_shard, self.musicals[la].songs, self.musicals[lb].songs,
+                          cand, min_k, jaccard_min, weight_threshold): (la, lb)
+                for la, lb, cand in todo
+            }
+            for fut, (la, lb) in futs.items():
+                A, B = self.musicals[la].songs, self.musicals[lb].songs
+                self._cross[(la, lb, min_k, jaccard_min, weight_threshold)] = [
+                    (A[i].name, B[j].name, w, ph) for i, j, w, ph in fut.result()
+                ]
+
+    # ---------- graphs ----------
+    def musical_graph(self, label: str, min_k: int = 3, jaccard_min: Optional[float] = None,
+                      weight_threshold: float = 0.0) -> nx.Graph:
+        """Per-musical phrase graph (built once per parameter set)."""
+        key = (label, min_k, jaccard_min, weight_threshold)
+        if key not in self._within:
+            self._within[key] = self.musicals[label].create_song_graph_phrase_only(
+                min_k=min_k, jaccard_min=jaccard_min, weight_threshold=weight_threshold
+            )
+        return self._within[key]
+
+    def combined_graph(self, min_k: int = 3, jaccard_min: Optional[float] = None,
+                       weight_threshold: float = 0.0, processes: Optional[int] = 1) -> nx.Graph:
+        """
+        Union of all per-musical graphs plus cross-musical edges (cross=True);
+        both keep edges with 0 < weight >= weight_threshold.
+        """
+        self.build_cross_edges(min_k, jaccard_min, weight_threshold, processes=processes)
+        G = nx.Graph()
+        for label in self.musicals:
+            sub = self.musical_graph(label, min_k, jaccard_min, weight_threshold)
+            for n, d in sub.nodes(data=True):
+                G.add_node(self.node_id(label, n), musical=label, **d)
+            for u, v, d in sub.edges(data=True):
+                if not _keep_edge(d["weight"], weight_threshold):
+                    continue
+                G.add_edge(self.node_id(label, u), self.node_id(label, v), cross=False, **d)
+        for la, lb in combinations(self.musicals, 2):
+            for a, b, w, phrases in self._cross[(la, lb, min_k, jaccard_min, weight_threshold)]:
+                G.add_edge(self.node_id(la, a), self.node_id(lb, b), weight=w,
+                           phrases=" | ".join(phrases), cross=True)
+        return G
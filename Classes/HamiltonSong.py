@@ -1,11 +1,34 @@
 # --- deps expected in scope ---
 import os, re, string
+from bisect import bisect_right
+from collections import Counter
 from time import process_time_ns
 
 import networkx as nx
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional, Tuple
 
-from Classes.utils import all_maximal_common_phrases, tokenize
+from Classes.utils import (all_maximal_common_phrases, all_maximal_common_phrases_tokens,
+                           fuzzy_common_phrases_tokens, line_index, phrase_score_upper_bound,
+                           repeat_blocks, tokenize, iter_tokens)
+
+
+# ----- fast-path patterns (compiled once, shared by LyricsPreprocessor.clean) -----
+# `\[.*?]` stops at the first "]" on the same line, i.e. `\[[^\]\n]*\]`
+_SPEAKER_RE = re.compile(r"\[[^\]\n]*\]")
+_MULTI_SPACE_RE = re.compile(r" {2,}")
+# a compiled char class beats str.translate on this (non-ASCII) corpus
+_PUNCT_RE = re.compile("[" + re.escape(string.punctuation + "’—‘") + "]+")
+# "[JEFFERSON/MADISON]", "[LAURENS, MULLIGAN, & LAFAYETTE]", "[COMPANY (EXCEPT HAMILTON)]"
+_SPEAKER_SEP_RE = re.compile(r"\s*(?:/|,|&|\bAND\b)\s*")
+_PAREN_RE = re.compile(r"\([^)]*\)")
+
+
+def split_speakers(label: Optional[str]) -> Tuple[str, ...]:
+    """Individual speakers of a speaker tag label (parenthetical notes dropped)."""
+    if not label:
+        return ()
+    names = _SPEAKER_SEP_RE.split(_PAREN_RE.sub("", label))
+    return tuple(dict.fromkeys(n.strip() for n in names if n.strip()))
 
 
 class LyricsPreprocessor:
@@ -14,6 +37,23 @@ class LyricsPreprocessor:
     Mirrors the existing underscore-prefixed helpers as static methods.
     """
 
+    @staticmethod
+    def clean(s: str) -> str:
+        """
+        Drop-in equivalent of the speaker/doubles/punctuation/empty-lines/tabs chain
+        followed by lower().strip(). Uses precompiled patterns and skips the
+        newline collapse, which the empty-line filter makes redundant.
+        """
+        return " ".join(LyricsPreprocessor.clean_lines(s)).strip()
+
+    @staticmethod
+    def clean_lines(s: str) -> List[str]:
+        """clean() before the lines are joined: the non-empty cleaned lines."""
+        s = _SPEAKER_RE.sub("", s)
+        s = _MULTI_SPACE_RE.sub(" ", s)
+        s = _PUNCT_RE.sub("", s)
+        return [line.replace("\t", " ").lower() for line in s.splitlines() if line.strip()]
+
     @staticmethod
     def _remove_doubles(s: str) -> str:
         s = re.sub(r" +", " ", s)
@@ -70,10 +110,15 @@ class HamiltonSong:
     Represents a Hamilton song with cleaned lyrics and metadata.
     Phrase-only connection_to() uses shared maximal phrases (>= min_k).
     """
-    def __init__(self, name: str, filepath: str, song_location: Optional[int] = None, act_number: Optional[int] = None):
+    def __init__(self, name: str, filepath: str, song_location: Optional[int] = None, act_number: Optional[int] = None,
+                 lazy: bool = False, token_store=None):
         self.name = name.split(".txt")[0]
         self.filepath = filepath
 
+        # lazy mode: nothing is read until tokens/lyrics are first needed
+        self.lazy = lazy
+        self._token_store = token_store   # optional Classes.TokenStore backing the tokens
+
         # metadata (can be set by Musical)
         self.song_location = song_location
         self.act_number = act_number
@@ -86,70 +131,298 @@ class HamiltonSong:
         # caches
         self._tokens_cache = None
         self._token_count = None
+        self.token_ids = None         # interned ids (only when preprocessed with a vocab)
+        self._kgram_cache: Dict[int, Counter] = {}
+        self._repeat_blocks = None
+        self.line_spans = None        # (start, end) token offsets per lyric line
+        self.speaker_segments = None  # (start, end, label) token offsets per speaker tag
+        self._line_index = None
 
     def __repr__(self):
         return f"HamiltonSong({self.name})"
 
+    # ---------- pickling: store-backed songs travel as (store, name) ----------
+    @property
+    def store_backed(self) -> bool:
+        """True if the tokens can be re-read from the attached token store."""
+        return self._token_store is not None and self.name in self._token_store
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if self.store_backed:
+            # the store pickles by path: the receiving process maps the same file
+            # and decodes this song from it on first use, instead of getting tokens
+            state.update(lazy=True, lyrics_raw="", lyrics="", text_for_ngraming="",
+                         _tokens_cache=None, _token_count=None, token_ids=None, _kgram_cache={},
+                         _repeat_blocks=None, line_spans=None, speaker_segments=None, _line_index=None)
+        return state
+
     # ---------- I/O ----------
-    def read_file(self):
+    def read_file(self, keep_raw: bool = True):
         with open(self.filepath, "r", encoding="utf8") as f:
-            self.lyrics_raw = f.read()
-        text = self.lyrics_raw.replace(self.name, "", 1)
+            raw = f.read()
+        self.lyrics_raw = raw if keep_raw else ""
+        text = raw.replace(self.name, "", 1)
         if "Last Update" in text:
             text = text[: text.find("Last Update")]
         self.lyrics = text
 
-    def preprocess_text(self):
+    def ensure_loaded(self):
+        """
+        Materialize lyrics and tokens of a lazily registered song on first use.
+        Tokens come from the attached token store if it has this song, else the
+        file is read and preprocessed (without retaining the raw text).
+        """
+        if not self.lazy or self._tokens_cache is not None:
+            return
+        if self.store_backed:
+            self._tokens_cache = self._token_store.tokens(self.name)
+            self._token_count = len(self._tokens_cache)
+            self.line_spans = self._token_store.line_spans(self.name)
+            self.speaker_segments = self._token_store.speaker_segments(self.name)
+            self._line_index = None
+            # tokens re-tokenize to themselves, so this is equivalent to the cleaned lyrics
+            self.lyrics = " ".join(self._tokens_cache)
+            self.text_for_ngraming = self.lyrics
+        else:
+            self.read_file(keep_raw=False)
+            self.preprocess_text()
+
+    def preprocess_text(self, fast: bool = True, vocab: Optional[dict] = None):
+        """
+        Clean lyrics and fill the token cache.
+        fast=True uses LyricsPreprocessor.clean(); fast=False runs the
+        original step-by-step chain (kept for reference/equivalence checks).
+        If `vocab` is given, token ids are interned into it as `token_ids`.
+        """
         if not self.lyrics and self.lyrics_raw:
             self.lyrics = self.lyrics_raw
 
-        s = self.lyrics
-        s = LyricsPreprocessor._remove_speaker_pattern(s)
-        s = LyricsPreprocessor._remove_doubles(s)
-        s = LyricsPreprocessor._remove_punctuation(s)
-        s = LyricsPreprocessor._remove_empty_lines(s)
-        s = LyricsPreprocessor._remove_tabs(s)
-        s = s.lower().strip()
+        s = source = self.lyrics
+        lines = None
+        if fast:
+            lines = LyricsPreprocessor.clean_lines(s)
+            s = " ".join(lines).strip()
+        else:
+            s = LyricsPreprocessor._remove_speaker_pattern(s)
+            s = LyricsPreprocessor._remove_doubles(s)
+            s = LyricsPreprocessor._remove_punctuation(s)
+            s = LyricsPreprocessor._remove_empty_lines(s)
+            s = LyricsPreprocessor._remove_tabs(s)
+            s = s.lower().strip()
 
         self.lyrics = s
         self.text_for_ngraming = "".join(self.lyrics.split("\n"))
 
-        self._tokens_cache = tokenize(self.lyrics)
+        self._kgram_cache = {}
+        self._repeat_blocks = None
+        self._line_index = None
+        self._token_store = None   # the tokens are now this run's, not the store's
+        if lines is None:
+            self._tokens_cache = tokenize(self.lyrics)
+            self.line_spans = None
+        else:
+            # tokens never cross the joining space, so per-line tokens concatenate to tokenize(lyrics)
+            self._tokens_cache, self.line_spans = [], []
+            for line in lines:
+                start = len(self._tokens_cache)
+                self._tokens_cache.extend(tokenize(line))
+                self.line_spans.append((start, len(self._tokens_cache)))
         self._token_count = len(self._tokens_cache)
+        self.speaker_segments = self._speaker_segments(source) if fast else None
+        if vocab is not None:
+            self.token_ids = list(iter_tokens(self.lyrics, vocab=vocab, lowered=True))
+
+    def _speaker_segments(self, text: str) -> Optional[List[Tuple[int, int, Optional[str]]]]:
+        """
+        Token ranges between speaker tags of the uncleaned text, as (start, end, label);
+        tokens before the first tag have label None. Returns None if a tag sits inside
+        a word (the pieces would not tokenize to the song's tokens).
+        """
+        segments = []
+        start, label, pos = 0, None, 0
+        for m in _SPEAKER_RE.finditer(text):
+            end = start + len(tokenize(" ".join(LyricsPreprocessor.clean_lines(text[pos:m.start()]))))
+            if end > start:
+                segments.append((start, end, label))
+            start, label, pos = end, m.group()[1:-1].strip().upper() or None, m.end()
+        end = start + len(tokenize(" ".join(LyricsPreprocessor.clean_lines(text[pos:]))))
+        if end > start:
+            segments.append((start, end, label))
+        return segments if end == self._token_count else None
+
+    def speakers_in(self, start: int, end: int) -> List[Optional[str]]:
+        """Speaker labels of the segments overlapping tokens [start, end), in order."""
+        segs = self.speaker_segments
+        if not segs:
+            return []
+        k = max(0, bisect_right([s for s, _, _ in segs], start) - 1)
+        out = []
+        while k < len(segs) and segs[k][0] < end:
+            if segs[k][1] > start and segs[k][2] not in out:
+                out.append(segs[k][2])
+            k += 1
+        return out
 
     # ---------- utilities ----------
     @property
     def token_count(self) -> int:
+        self.ensure_loaded()
         if self._token_count is None:
             self._tokens_cache = tokenize(self.lyrics)
             self._token_count = len(self._tokens_cache)
         return self._token_count
 
     # ---------- phrase-only connection ----------
-    def connection_to(self, other: "HamiltonSong", min_k: int = 3, jaccard_min: Optional[float] = None) -> float:
+    def shared_counts(self, other: "HamiltonSong", k: int) -> int:
+        """sum over k-grams common to both songs of countA * countB."""
+        a, b = self.kgram_counts(k), other.kgram_counts(k)
+        if len(b) < len(a):
+            a, b = b, a
+        return sum(c * b[g] for g, c in a.items() if g in b)
+
+    def phrase_upper_bound(self, other: "HamiltonSong", min_k: int = 3) -> float:
+        """Cheap upper bound on connection_to()'s weight (see phrase_score_upper_bound)."""
+        windows = self.shared_counts(other, min_k)
+        if windows == 0:
+            return 0.0
+        return phrase_score_upper_bound(windows, self.shared_counts(other, 1),
+                                        self.token_count, other.token_count, min_k)
+
+    def connection_to(self, other: "HamiltonSong", min_k: int = 3, jaccard_min: Optional[float] = None,
+                      weight_threshold: Optional[float] = None, stats: Optional[dict] = None,
+                      use_repeats: bool = True, max_edits: int = 0,
+                      matches: Optional[list] = None,
+                      phrase_weight: Optional[Callable[[str], float]] = None,
+                      phrase_weight_max: float = 1.0) -> float:
         """
         Strength = sum(len(phrase)^2) / min(token_count(self), token_count(other))
         Uses all_maximal_common_phrases (>= min_k).
+        With weight_threshold set, returns (0.0, []) without running the matcher when
+        the upper bound already rules out reaching it. `stats` (dict) counts
+        "bound_pruned" and "matched" pairs.
+        When both songs have line spans, identical lines are hash-joined first and
+        the DP is skipped (same phrases). Otherwise use_repeats runs the matcher on
+        the repeat-compressed form of the more repetitive song (the phrase set is
+        symmetric, so the result is identical).
+        max_edits > 0 also counts phrases differing by up to that many token edits
+        (fuzzy_common_phrases_tokens); the exact-match bound does not apply then.
+        If `matches` (list) is given, the kept phrase dicts are appended to it with
+        a_spans in self and b_spans in other (see speaker_pairs).
+        phrase_weight(phrase) multiplies each phrase's len^2 (e.g. corpus rarity,
+        see Musical.phrase_weigher); phrase_weight_max (its largest value) keeps
+        the upper bound valid.
         """
+        self.ensure_loaded()
+        other.ensure_loaded()
         if not self.lyrics or not other.lyrics:
             raise ValueError("Call read_file() and preprocess_text() first for both songs.")
 
-        res = all_maximal_common_phrases(
-            self.lyrics,
-            other.lyrics,
-            min_k=min_k,
-            keep_apostrophes=True,
-            jaccard_min=jaccard_min
-        )
+        if weight_threshold is not None and weight_threshold > 0 and max_edits <= 0:
+            # round() is monotone, so a rounded bound below the threshold rules out the rounded score
+            if round(self.phrase_upper_bound(other, min_k) * phrase_weight_max, 6) < weight_threshold:
+                if stats is not None:
+                    stats["bound_pruned"] = stats.get("bound_pruned", 0) + 1
+                return 0.0, []
+        if stats is not None:
+            stats["matched"] = stats.get("matched", 0) + 1
+
+        if max_edits > 0:
+            res = fuzzy_common_phrases_tokens(
+                self.tokens_cache,
+                other.tokens_cache,
+                min_k=min_k,
+                max_edits=max_edits,
+                jaccard_min=jaccard_min
+            )
+        elif self.line_spans is not None and other.line_spans is not None:
+            res = all_maximal_common_phrases_tokens(
+                self.tokens_cache,
+                other.tokens_cache,
+                min_k=min_k,
+                jaccard_min=jaccard_min,
+                a_lines=self.line_spans,
+                b_line_index=other.line_index
+            )
+        elif use_repeats:
+            a, b = (self, other) if self.repeat_ratio >= other.repeat_ratio else (other, self)
+            res = all_maximal_common_phrases_tokens(
+                a.tokens_cache,
+                b.tokens_cache,
+                min_k=min_k,
+                jaccard_min=jaccard_min,
+                a_blocks=a.repeat_blocks
+            )
+            if a is other and matches is not None:
+                res["all_maximal"] = [dict(p, a_spans=p["b_spans"], b_spans=p["a_spans"])
+                                      for p in res["all_maximal"]]
+        else:
+            res = all_maximal_common_phrases(
+                self.lyrics,
+                other.lyrics,
+                min_k=min_k,
+                keep_apostrophes=True,
+                jaccard_min=jaccard_min
+            )
         
         phrases = res["all_maximal"]
+        if matches is not None:
+            matches.extend(phrases)
         if not phrases:
             return 0.0, []
 
-        total_weight = sum(p["length"] ** 2 for p in phrases)
+        if phrase_weight is None:
+            total_weight = sum(p["length"] ** 2 for p in phrases)
+        else:
+            # fuzzy phrases have two wordings; the smaller weight keeps the score symmetric
+            total_weight = sum(p["length"] ** 2 * min(phrase_weight(p["phrase"]),
+                                                      phrase_weight(p.get("b_phrase", p["phrase"])))
+                               for p in phrases)
         denom = max(1, min(self.token_count, other.token_count))
         return round(total_weight / denom, 6), [x['phrase'] for x in phrases]
     
+    def speaker_pairs(self, other: "HamiltonSong", matches: list):
+        """
+        Attribute matched phrases to speakers by interval lookup on speaker_segments.
+        Yields (speaker in self, speaker in other, phrase, length) per aligned span pair
+        and overlapping segment labels; unlabeled text yields None.
+        """
+        for p in matches:
+            for (a0, a1), (b0, b1) in zip(p["a_spans"], p["b_spans"]):
+                for sa in self.speakers_in(a0, a1) or [None]:
+                    for sb in other.speakers_in(b0, b1) or [None]:
+                        yield sa, sb, p["phrase"], p["length"]
+
+    def kgram_counts(self, k: int) -> Counter:
+        """Counter of this song's contiguous k-token windows (as tuples), cached per k."""
+        counts = self._kgram_cache.get(k)
+        if counts is None:
+            toks = self.tokens_cache
+            counts = Counter(zip(*(toks[i:] for i in range(k)))) if k > 1 else Counter(toks)
+            self._kgram_cache[k] = counts
+        return counts
+
+    @property
+    def line_index(self) -> Optional[dict]:
+        """Normalized line (token tuple) -> token start offsets; None without line spans."""
+        if self._line_index is None and self.line_spans is not None:
+            self._line_index = line_index(self.tokens_cache, self.line_spans)
+        return self._line_index
+
+    @property
+    def repeat_blocks(self):
+        """Repeat-compressed form of the tokens: [(start, length, src)], src=None for literals."""
+        if self._repeat_blocks is None:
+            self._repeat_blocks = repeat_blocks(self.tokens_cache)
+        return self._repeat_blocks
+
+    @property
+    def repeat_ratio(self) -> float:
+        """Fraction of tokens covered by copies of earlier blocks."""
+        n = self.token_count
+        return sum(l for _, l, src in self.repeat_blocks if src is not None) / n if n else 0.0
+
     @property
     def tokens_cache(self):
+        self.ensure_loaded()
         return self._tokens_cache
@@ -1,9 +1,14 @@
+import hashlib
+import heapq
 import math
 from typing import Dict, List, Optional
 import os
 import networkx as nx
-from Classes.HamiltonSong import HamiltonSong
-from Classes.utils import tokenize
+from Classes.HamiltonSong import HamiltonSong, split_speakers
+from Classes.PhraseIndex import PhraseIndex
+from Classes.TokenStore import TokenStore
+from Classes.communities import detect_communities, project_communities
+from Classes.utils import phrase_score_upper_bound, tokenize
 
 # Note: this module assumes a `tokenize` function exists elsewhere in the codebase.
 # Ensure it is imported here when available.
@@ -51,33 +56,191 @@ def _motif_score(song_a: HamiltonSong,
 
 
 
+def _file_sha1(filepath: str) -> str:
+    h = hashlib.sha1()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _current_sig(filepath: str, entry: dict) -> Optional[dict]:
+    """
+    The source signature of `filepath` if the file still matches `entry`, else None.
+    (mtime, size) are compared first; a touched file of the same size falls back
+    to its sha1 and, if unchanged, gets the new mtime in the returned signature.
+    """
+    try:
+        st = os.stat(filepath)
+    except OSError:
+        return None
+    sig = {"mtime_ns": entry["mtime_ns"], "size": entry["size"], "sha1": entry["sha1"]}
+    if (st.st_mtime_ns, st.st_size) != (entry["mtime_ns"], entry["size"]):
+        # touched but maybe not changed: compare content hashes
+        if st.st_size != entry["size"] or _file_sha1(filepath) != entry["sha1"]:
+            return None
+        sig["mtime_ns"] = st.st_mtime_ns
+    return sig
+
+
 class Musical:
     """
     Manages a set of HamiltonSong objects, their order/acts, and builds graphs.
     """
-    def __init__(self, base_dir: str, song_order: Dict[str, int]):
+    def __init__(self, base_dir: str, song_order: Dict[str, int], act_split: Optional[int] = 23):
         """
         song_order.json keys: filename including '.txt' (e.g., 'My Shot.txt') -> 1-based order index.
+        act_split: last order index of Act I (None → every song is act 1).
         """
         self.base_dir = base_dir
         self.song_order = song_order
+        self.act_split = act_split
         self.songs: List[HamiltonSong] = []
+        self.token_store: Optional[TokenStore] = None
+        self._source_sigs: Dict[str, dict] = {}   # song name -> {mtime_ns, size, sha1} of its file
+        self._postings: Dict[int, dict] = {}      # k -> {k-gram: {song index: count}}
+        self._motif_tfidf: Dict[tuple, tuple] = {}  # (motifs, rarity_alpha) -> (motif_tf, motif_idf)
+        self._phrase_index: Optional[PhraseIndex] = None
 
-    def load_songs(self, names: List[str]):
+    def load_songs(self, names: List[str], lazy: bool = False, token_store_path: Optional[str] = None):
         """
         Create HamiltonSong objects, attach order/act metadata, read & preprocess.
         `names` are song base names without .txt.
+        With lazy=True songs are only registered by path; tokens are computed on
+        first access, from the token store at `token_store_path` when it exists
+        (see build_token_store) and the song's file still matches the signature
+        recorded there; other songs are read from their files.
         """
+        store = None
+        entries = {}
+        if lazy and token_store_path is not None and os.path.exists(token_store_path):
+            store = TokenStore(token_store_path)
+            entries = {e["file"]: e for e in store.meta.get("songs", [])}
+        self.token_store = store
+
         self.songs = []
+        self._postings = {}
+        self._motif_tfidf = {}
+        self._phrase_index = None
         for name in names:
             filepath = os.path.join(self.base_dir, f"{name}")
             order = self.song_order.get(f"{name}")
-            act = 1 if (order is not None and order <= 23) else 2
-            song = HamiltonSong(name=name, filepath=filepath, song_location=order, act_number=act)
-            song.read_file()
-            song.preprocess_text()
+            act = self._act_for(order)
+            song = HamiltonSong(name=name, filepath=filepath, song_location=order, act_number=act, lazy=lazy)
+            entry = entries.get(os.path.basename(filepath))
+            if entry is not None and song.name in store:
+                sig = _current_sig(filepath, entry)
+                if sig is not None:
+                    self._source_sigs[song.name] = sig
+                    song._token_store = store
+            if not lazy:
+                song.read_file()
+                song.preprocess_text()
             self.songs.append(song)
-    
+
+    def _act_for(self, order: Optional[int]) -> int:
+        if self.act_split is None:
+            return 1
+        return 1 if (order is not None and order <= self.act_split) else 2
+
+    def build_token_store(self, path: str) -> TokenStore:
+        """
+        Write the preprocessed tokens of all songs into one memory-mapped file
+        (offsets table per song, source file signatures) and back the songs with it.
+        """
+        store = TokenStore.write(path, ((s.name, s.tokens_cache) for s in self.songs),
+                                 meta={"songs": self._song_entries()}, **self._song_layouts())
+        self._attach_token_store(store)
+        return store
+
+    def _song_entries(self) -> List[dict]:
+        """Per-song store metadata: file, order/act and the (mtime, size, sha1) signature of its source."""
+        entries = []
+        for s in self.songs:
+            st = os.stat(s.filepath)
+            prev = self._source_sigs.get(s.name)
+            if prev and prev["mtime_ns"] == st.st_mtime_ns and prev["size"] == st.st_size:
+                sha1 = prev["sha1"]
+            else:
+                sha1 = _file_sha1(s.filepath)
+            sig = {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "sha1": sha1}
+            self._source_sigs[s.name] = sig
+            entries.append({"name": s.name, "file": os.path.basename(s.filepath),
+                            "song_location": s.song_location, "act_number": s.act_number, **sig})
+        return entries
+
+    def _song_layouts(self) -> Dict[str, dict]:
+        """line_spans / speaker_segments keyword arguments of TokenStore.write."""
+        for s in self.songs:
+            s.ensure_loaded()   # lazy songs get their spans together with the tokens
+        return {
+            "line_spans": {s.name: s.line_spans for s in self.songs if s.line_spans is not None},
+            "speaker_segments": {s.name: s.speaker_segments for s in self.songs
+                                 if s.speaker_segments is not None},
+        }
+
+    def _attach_token_store(self, store: TokenStore):
+        self.token_store = store
+        for s in self.songs:
+            s._token_store = store
+
+    # ---------- snapshots ----------
+    def save_snapshot(self, path: str) -> TokenStore:
+        """
+        Persist song metadata (song_order, act numbers, source file signatures),
+        cleaned tokens as id arrays, their line spans and speaker segments and the
+        vocabulary in one token-store file.
+        """
+        meta = {"base_dir": self.base_dir, "song_order": self.song_order,
+                "act_split": self.act_split, "songs": self._song_entries()}
+        store = TokenStore.write(path, ((s.name, s.tokens_cache) for s in self.songs), meta=meta,
+                                 **self._song_layouts())
+        self._attach_token_store(store)
+        return store
+
+    @classmethod
+    def load_snapshot(cls, path: str,
+                      base_dir: Optional[str] = None,
+                      song_order: Optional[Dict[str, int]] = None,
+                      names: Optional[List[str]] = None,
+                      refresh: bool = True) -> "Musical":
+        """
+        Restore a Musical written by save_snapshot().
+        Each song file is validated by (mtime, size), falling back to its sha1;
+        only changed files (and `names` absent from the snapshot) are re-read and
+        re-preprocessed, the rest stay lazily backed by the snapshot's token ids.
+        With refresh=True the snapshot is rewritten when anything was rebuilt.
+        """
+        meta = {}
+        if os.path.exists(path):
+            store = TokenStore(path)
+            meta = store.meta
+            store.close()
+        base_dir = base_dir if base_dir is not None else meta.get("base_dir")
+        song_order = song_order if song_order is not None else meta.get("song_order", {})
+        if base_dir is None:
+            raise ValueError(f"No snapshot at {path}; pass base_dir to build one.")
+
+        entries = {e["file"]: e for e in meta.get("songs", [])}
+        if names is None:
+            names = list(entries) if entries else sorted(os.listdir(base_dir))
+
+        musical = cls(base_dir, song_order=song_order, act_split=meta.get("act_split", 23))
+        musical.load_songs(names, lazy=True, token_store_path=path)
+
+        stale = musical.token_store is None
+        for song in musical.songs:
+            if song._token_store is None:
+                stale = True
+                continue
+            entry = entries[os.path.basename(song.filepath)]
+            if musical._source_sigs[song.name]["mtime_ns"] != entry["mtime_ns"]:
+                stale = True   # only the signature moved; rewrite to skip hashing next time
+
+        if stale and refresh:
+            musical.save_snapshot(path)
+        return musical
+
     def _compute_motif_tfidf(self, motifs: List[str], rarity_alpha: float = 1.0):
         """
         Compute TF (per song) and IDF (across songs) for each motif.
@@ -85,12 +248,17 @@ class Musical:
         Returns:
             motif_tf: dict[song_name][motif] = count of motif occurrences
             motif_idf: dict[motif] = IDF(k)^rarity_alpha
+        Cached per (motifs, rarity_alpha) until the next load_songs(); treat the
+        returned dicts as read-only.
         """
+        key = (tuple(motifs), rarity_alpha)
+        if key in self._motif_tfidf:
+            return self._motif_tfidf[key]
         motif_tf = {song.name: {} for song in self.songs}
         motif_doc_count = {m: 0 for m in motifs}
         
         for song in self.songs:
-            tokens = tokenize(song.lyrics)
+            tokens = song.tokens_cache
             for m in motifs:
                 m_tokens = tokenize(m)
                 L = len(m_tokens)
@@ -110,47 +278,294 @@ class Musical:
             # standard smoothed IDF: log((N + 1) / (1 + n_k)) + 1
             idf = math.log((N + 1) / (1 + n_k)) + 1
             motif_idf[m] = idf ** rarity_alpha
-        
+
+        self._motif_tfidf[key] = (motif_tf, motif_idf)
         return motif_tf, motif_idf
     
+    # ---------- communities ----------
+    def detect_communities(self, G, method: str = "louvain", seed: int = 0) -> Dict[str, int]:
+        """
+        {song name: community id} for a graph built by this Musical. Computed once
+        per graph (cached by fingerprint); project it onto act subgraphs with
+        communities_for() or pass it to draw_timeline_1 directly.
+        """
+        return detect_communities(G, method=method, seed=seed)
+
+    def communities_for(self, assignment: Dict[str, int], subgraph) -> List[set]:
+        return project_communities(assignment, subgraph.nodes())
+
+    # ---------- n-gram index / nearest songs ----------
+    def _ngram_postings(self, k: int) -> dict:
+        """Inverted index k-gram -> {song index: count}, built once per k."""
+        postings = self._postings.get(k)
+        if postings is None:
+            postings = {}
+            for idx, song in enumerate(self.songs):
+                for g, c in song.kgram_counts(k).items():
+                    postings.setdefault(g, {})[idx] = c
+            self._postings[k] = postings
+        return postings
+
+    def phrase_index(self) -> PhraseIndex:
+        """Document frequencies of all phrases of the loaded songs (built once, see PhraseIndex)."""
+        if self._phrase_index is None:
+            self._phrase_index = PhraseIndex([s.tokens_cache for s in self.songs])
+        return self._phrase_index
+
+    def phrase_weigher(self, rarity_alpha: float = 1.0):
+        """
+        (weight(phrase), max weight) for connection_to: the phrase's smoothed IDF
+        over the loaded songs, as for motifs, raised to rarity_alpha. Any phrase
+        shared by two songs has df >= 2, which gives the max weight.
+        """
+        index = self.phrase_index()
+        cache: Dict[str, float] = {}
+
+        def weight(phrase: str) -> float:
+            w = cache.get(phrase)
+            if w is None:
+                w = cache[phrase] = index.idf(phrase.split(), rarity_alpha)
+            return w
+
+        n = len(self.songs)
+        return weight, (math.log((n + 1) / 3) + 1) ** rarity_alpha if n >= 2 else 1.0
+
+    def _shared_counts(self, idx: int, k: int) -> Dict[int, int]:
+        """For song `idx`: {other index: sum over shared k-grams of countA * countB}."""
+        postings = self._ngram_postings(k)
+        shared: Dict[int, int] = {}
+        for g, c in self.songs[idx].kgram_counts(k).items():
+            for j, cj in postings[g].items():
+                if j != idx:
+                    shared[j] = shared.get(j, 0) + c * cj
+        return shared
+
+    def most_similar(self,
+                     song,
+                     k: int = 5,
+                     min_k: int = 3,
+                     motif_weight: float = 0.5,
+                     motifs: Optional[List[str]] = None,
+                     motif_rarity_alpha: float = 1.0,
+                     jaccard_min: Optional[float] = None):
+        """
+        The k songs most connected to `song` (name or HamiltonSong), scored like
+        create_song_graph_with_motifs: phrase_score + motif_weight * motif_score.
+
+        Candidates are ranked by an upper bound (exact motif score from the TF
+        table + phrase_score_upper_bound from shared min_k-gram/token counts) and
+        connection_to() only runs while a candidate's bound can still enter the
+        current top k.
+        Returns [(name, weight, phrases)] sorted by weight desc.
+        """
+        names = [s.name for s in self.songs]
+        target_name = song.name if isinstance(song, HamiltonSong) else song
+        if target_name not in names:
+            raise ValueError(f"Unknown song: {target_name}")
+        t = names.index(target_name)
+        target = self.songs[t]
+
+        if k <= 0:
+            return []
+
+        motifs = motifs or []
+        if motifs:
+            motif_tf, motif_idf = self._compute_motif_tfidf(motifs=motifs, rarity_alpha=motif_rarity_alpha)
+        windows = self._shared_counts(t, min_k)
+        unigrams = self._shared_counts(t, 1)
+
+        bounds = []
+        n_t = target.token_count
+        for j, other in enumerate(self.songs):
+            if j == t or other.name == target_name:
+                continue
+            m_score = 0.0
+            if motifs:
+                # same value _motif_score() would compute, read off the TF table
+                tf_a, tf_b = motif_tf[target_name], motif_tf[other.name]
+                total = sum((motif_idf.get(m, 1.0) ** motif_rarity_alpha) * min(tf_a[m], tf_b[m])
+                            for m in motifs if tf_a[m] and tf_b[m])
+                m_score = total / max(1, min(n_t, other.token_count))
+            ub = phrase_score_upper_bound(windows.get(j, 0), unigrams.get(j, 0),
+                                          n_t, other.token_count, min_k)
+            bounds.append((ub + motif_weight * m_score, m_score, j))
+        bounds.sort(key=lambda x: -x[0])
+
+        top = []  # min-heap of (weight, -index, name, phrases)
+        for ub, m_score, j in bounds:
+            if ub <= 0 or (len(top) >= k and ub <= top[0][0]):
+                break
+            other = self.songs[j]
+            p_score, phrases = target.connection_to(other, min_k=min_k, jaccard_min=jaccard_min)
+            w = round(p_score + motif_weight * m_score, 6)
+            if w <= 0:
+                continue
+            if motifs:
+                tf_a, tf_b = motif_tf[target_name], motif_tf[other.name]
+                phrases = phrases + [m for m in motifs if tf_a[m] and tf_b[m]]
+            item = (w, -j, other.name, phrases)
+            if len(top) < k:
+                heapq.heappush(top, item)
+            elif item > top[0]:
+                heapq.heapreplace(top, item)
+
+        return [(name, w, phrases) for w, _, name, phrases in sorted(top, reverse=True)]
+
+    def _new_graph(self, directed: bool, backend: str):
+        """Empty graph with song nodes, or a sparse edge builder with the same add_edge()."""
+        if backend == "sparse":
+            from Classes.SparseSongGraph import SparseSongGraph  # scipy is optional
+            return SparseSongGraph.builder(self.songs, directed=directed)
+        if backend != "networkx":
+            raise ValueError(f"Unknown graph backend: {backend}")
+        G = nx.DiGraph() if directed else nx.Graph()
+        for s in self.songs:
+            G.add_node(s.name, act=s.act_number, order=s.song_location)
+        return G
+
+    def _phrase_weight_kwargs(self, phrase_rarity_alpha: float) -> dict:
+        if not phrase_rarity_alpha:
+            return {}
+        weight, weight_max = self.phrase_weigher(phrase_rarity_alpha)
+        return {"phrase_weight": weight, "phrase_weight_max": weight_max}
+
+    def _scheduled_pairs(self, max_story_distance: Optional[int] = None, same_act: bool = False,
+                         stats: Optional[dict] = None):
+        """
+        Index pairs (i, j), i < j, of self.songs to compare, in (i, j) order.
+
+        Without restrictions this is every pair. max_story_distance keeps pairs whose
+        song_location differs by at most that much, enumerated with a sliding window
+        over the story order (O(N * w)); same_act keeps pairs from the same act.
+        Songs without a song_location cannot be placed in the window, nor in an act
+        when the acts are split (_act_for only defaults them to act 2), and are left
+        out, as are songs without an act; stats["unscheduled"] counts them.
+        """
+        n = len(self.songs)
+        if max_story_distance is None and not same_act:
+            return ((i, j) for i in range(n) for j in range(i + 1, n))
+        if max_story_distance is not None and max_story_distance < 0:
+            raise ValueError(f"max_story_distance must be >= 0, got {max_story_distance}")
+
+        placed, dropped = [], 0
+        for i, s in enumerate(self.songs):
+            unplaced = s.song_location is None and (max_story_distance is not None or self.act_split is not None)
+            if unplaced or (same_act and s.act_number is None):
+                dropped += 1
+            else:
+                placed.append(i)
+        if stats is not None:
+            stats["unscheduled"] = dropped
+
+        pairs = []
+        if max_story_distance is None:
+            by_act: Dict[int, List[int]] = {}
+            for i in placed:
+                by_act.setdefault(self.songs[i].act_number, []).append(i)
+            for members in by_act.values():
+                pairs.extend((i, j) for k, i in enumerate(members) for j in members[k + 1:])
+        else:
+            placed.sort(key=lambda i: (self.songs[i].song_location, i))
+            for k, i in enumerate(placed):
+                loc, act = self.songs[i].song_location, self.songs[i].act_number
+                for kk in range(k + 1, len(placed)):   # no slice: the window stays O(w) per song
+                    j = placed[kk]
+                    if self.songs[j].song_location - loc > max_story_distance:
+                        break
+                    if not same_act or self.songs[j].act_number == act:
+                        pairs.append((min(i, j), max(i, j)))
+        pairs.sort()
+        return pairs
+
     def create_song_graph_phrase_only(self,
                                       min_k: int = 3,
                                       jaccard_min: Optional[float] = None,
                                       weight_threshold: float = 0.0,
                                       directed: bool = False,
-                                      respect_story_order: bool = False):
+                                      respect_story_order: bool = False,
+                                      backend: str = "networkx",
+                                      early_exit: bool = True,
+                                      speaker_graph: bool = False,
+                                      max_story_distance: Optional[int] = None,
+                                      same_act: bool = False,
+                                      phrase_rarity_alpha: float = 0.0):
         """
         Phrase-only graph (your original formula).
+        backend="sparse" returns a SparseSongGraph (CSR weights) instead of networkx.
+        early_exit skips the matcher for pairs whose upper bound is below
+        weight_threshold (same graph; counters in self.pair_stats).
+        speaker_graph=True also fills self.speaker_graph from the same matching run
+        (see _add_speaker_edges); only edges that pass weight_threshold contribute.
+        max_story_distance / same_act restrict the compared pairs (see _scheduled_pairs).
+        phrase_rarity_alpha > 0 weights each phrase by its corpus IDF (phrase_weigher).
         """
-        G = nx.DiGraph() if directed else nx.Graph()
-        for s in self.songs:
-            G.add_node(s.name, act=s.act_number, order=s.song_location)
+        G = self._new_graph(directed, backend)
+        self.pair_stats = stats = {"pairs": 0, "bound_pruned": 0, "matched": 0}
+        thr = weight_threshold if early_exit else None
+        weigh = self._phrase_weight_kwargs(phrase_rarity_alpha)
+        SG = nx.DiGraph() if speaker_graph else None
+        matches = [] if speaker_graph else None
 
-        n = len(self.songs)
-        for i in range(n):
-            for j in range(i + (0 if directed else 1), n):
-                a, b = self.songs[i], self.songs[j]
-                if a.name == b.name:
+        for i, j in self._scheduled_pairs(max_story_distance, same_act, stats):
+            a, b = self.songs[i], self.songs[j]
+            if a.name == b.name:
+                continue
+            stats["pairs"] += 1
+
+            if directed and respect_story_order:
+                if a.song_location is None or b.song_location is None or a.song_location >= b.song_location:
                     continue
+                w, phrases = a.connection_to(b, min_k=min_k, jaccard_min=jaccard_min,
+                                             weight_threshold=thr, stats=stats, matches=matches, **weigh)
+                if w >= weight_threshold:
+                    G.add_edge(a.name, b.name, weight=w)
+            elif directed and not respect_story_order:
+                w_ab, phrases = a.connection_to(b, min_k=min_k, jaccard_min=jaccard_min,
+                                                weight_threshold=thr, stats=stats, matches=matches, **weigh)
+                w_ba, phrases = b.connection_to(a, min_k=min_k, jaccard_min=jaccard_min,
+                                                weight_threshold=thr, stats=stats, **weigh)
+                if w_ab >= weight_threshold:
+                    G.add_edge(a.name, b.name, weight=w_ab)
+                if w_ba >= weight_threshold:
+                    G.add_edge(b.name, a.name, weight=w_ba)
+                w = max(w_ab, w_ba)
+            else:
+                w, phrases = a.connection_to(b, min_k=min_k, jaccard_min=jaccard_min,
+                                             weight_threshold=thr, stats=stats, matches=matches, **weigh)
+                if w >= weight_threshold:
+                    G.add_edge(a.name, b.name, weight=w)
+            if matches:
+                if w >= weight_threshold:
+                    self._add_speaker_edges(SG, a, b, matches)
+                matches.clear()
+        if SG is not None:
+            for _, _, d in SG.edges(data=True):
+                d["phrases"] = " | ".join(sorted(d["phrases"]))
+                d["songs"] = " | ".join(f"{u} -> {v}" for u, v in sorted(d["songs"]))
+            self.speaker_graph = SG
+        return G if backend == "networkx" else G.build()
 
-                if directed and respect_story_order:
-                    if a.song_location is None or b.song_location is None or a.song_location >= b.song_location:
-                        continue
-                    w, phrases = a.connection_to(b, min_k=min_k, jaccard_min=jaccard_min)
-                    if w >= weight_threshold:
-                        G.add_edge(a.name, b.name, weight=w)
-                elif directed and not respect_story_order:
-                    w_ab, phrases = a.connection_to(b, min_k=min_k, jaccard_min=jaccard_min)
-                    w_ba, phrases = b.connection_to(a, min_k=min_k, jaccard_min=jaccard_min)
-                    if w_ab >= weight_threshold:
-                        G.add_edge(a.name, b.name, weight=w_ab)
-                    if w_ba >= weight_threshold:
-                        G.add_edge(b.name, a.name, weight=w_ba)
-                else:
-                    w, phrases = a.connection_to(b, min_k=min_k, jaccard_min=jaccard_min)
-                    if w >= weight_threshold:
-                        G.add_edge(a.name, b.name, weight=w)
-        return G
+    @staticmethod
+    def _add_speaker_edges(SG: nx.DiGraph, a: HamiltonSong, b: HamiltonSong, matches: list):
+        """
+        Character-to-character quotation edges for one matched song pair: an edge
+        from each speaker of the earlier song's span to each speaker of the later
+        song's span (a -> b when story order is unknown). weight counts span pairs.
+        """
+        swap = (a.song_location is not None and b.song_location is not None
+                and b.song_location < a.song_location)
+        src, dst = (b, a) if swap else (a, b)
+        for sa, sb, phrase, _ in a.speaker_pairs(b, matches):
+            if swap:
+                sa, sb = sb, sa
+            for u in split_speakers(sa):
+                for v in split_speakers(sb):
+                    if not SG.has_edge(u, v):
+                        SG.add_edge(u, v, weight=0, phrases=set(), songs=set())
+                    d = SG[u][v]
+                    d["weight"] += 1
+                    d["phrases"].add(phrase)
+                    d["songs"].add((src.name, dst.name))
 
 
     def create_song_graph_with_motifs(self,
@@ -160,51 +575,173 @@ class Musical:
                                       min_k: int = 3,
                                       jaccard_min: Optional[float] = None,
                                       weight_threshold: float = 0.0,
-                                      directed: bool = False):
+                                      directed: bool = False,
+                                      backend: str = "networkx",
+                                      early_exit: bool = True,
+                                      max_story_distance: Optional[int] = None,
+                                      same_act: bool = False,
+                                      phrase_rarity_alpha: float = 0.0):
         """
         Phrase + Motif graph.
         Edge weight = phrase_score + motif_weight * motif_score
         (motif_score is IDF-weighted min-TF overlap over curated 1–2-gram motifs).
+        backend="sparse" returns a SparseSongGraph (CSR weights) instead of networkx.
+        early_exit: compute the (cheap) motif score first and skip the phrase matcher
+        when the phrase upper bound cannot lift the pair to weight_threshold; pairs a
+        directed graph would drop anyway are skipped before scoring. Counters are
+        left in self.pair_stats.
+        max_story_distance / same_act restrict the compared pairs (see _scheduled_pairs).
+        phrase_rarity_alpha > 0 weights each phrase by its corpus IDF (phrase_weigher).
         """
-        G = nx.DiGraph() if directed else nx.Graph()
-        for s in self.songs:
-            G.add_node(s.name, act=s.act_number, order=s.song_location)
-        del s
+        G = self._new_graph(directed, backend)
+        self.pair_stats = stats = {"pairs": 0, "unordered_skipped": 0, "bound_pruned": 0,
+                                   "matched": 0, "below_threshold": 0}
+        weigh = self._phrase_weight_kwargs(phrase_rarity_alpha)
         
         motif_tf, motif_idf = self._compute_motif_tfidf(
             motifs=motifs, rarity_alpha=motif_rarity_alpha
         )
         
-        n = len(self.songs)
-        for i in range(n):
-            for j in range(i + 1, n):  # always skip self; one unordered pair
-                a, b = self.songs[i], self.songs[j]
-
-                # compute score (optionally take max of a→b and b→a if your scoring is asymmetric)
-                ps_ab, ph_ab = a.connection_to(b, min_k=min_k, jaccard_min=jaccard_min)
-                ps_ba, ph_ba = b.connection_to(a, min_k=min_k, jaccard_min=jaccard_min)
-                phrase_score = max(ps_ab, ps_ba)
-                phrases = (ph_ab if ps_ab >= ps_ba else ph_ba)
-                
-                m_ab, mh_ab = _motif_score(a, b, motifs=motifs, idf=motif_idf, rarity_alpha=motif_rarity_alpha)
-                m_ba, mh_ba = _motif_score(b, a, motifs=motifs, idf=motif_idf, rarity_alpha=motif_rarity_alpha)
-                motif_score = max(m_ab, m_ba)
-                phrases += (mh_ab if m_ab >= m_ba else mh_ba)
-                
-                w = phrase_score + motif_weight * motif_score
-                if w <= 0 or w < weight_threshold:
+        for i, j in self._scheduled_pairs(max_story_distance, same_act, stats):
+            a, b = self.songs[i], self.songs[j]
+            stats["pairs"] += 1
+            if early_exit and directed and (a.song_location is None or b.song_location is None):
+                stats["unordered_skipped"] += 1
+                continue
+
+            # both scores are symmetric (same phrase set, min-based denominators),
+            # so a→b equals b→a and one evaluation of each is enough
+            motif_score, motif_hits = _motif_score(a, b, motifs=motifs, idf=motif_idf,
+                                                   rarity_alpha=motif_rarity_alpha)
+            # phrase score needed for w >= weight_threshold (tiny margin for float rounding)
+            phrase_thr = (weight_threshold - motif_weight * motif_score - 1e-9) if early_exit else None
+            phrase_score, phrases = a.connection_to(b, min_k=min_k, jaccard_min=jaccard_min,
+                                                    weight_threshold=phrase_thr, stats=stats, **weigh)
+            phrases = phrases + motif_hits
+            
+            w = phrase_score + motif_weight * motif_score
+            if w <= 0 or w < weight_threshold:
+                stats["below_threshold"] += 1
+                continue
+            
+            if directed:
+                if a.song_location is None or b.song_location is None:
                     continue
-                
-                if directed:
-                    if a.song_location is None or b.song_location is None:
-                        continue
-                    # orient earlier → later; break ties by index
-                    if (a.song_location, i) < (b.song_location, j):
-                        G.add_edge(a.name, b.name, weight=round(w, 6), phrases=" | ".join(phrases))
-                    elif (b.song_location, j) < (a.song_location, i):
-                        G.add_edge(b.name, a.name, weight=round(w, 6), phrases=" | ".join(phrases))
-                    # equal locations → skip
-                else:
+                # orient earlier → later; break ties by index
+                if (a.song_location, i) < (b.song_location, j):
                     G.add_edge(a.name, b.name, weight=round(w, 6), phrases=" | ".join(phrases))
+                elif (b.song_location, j) < (a.song_location, i):
+                    G.add_edge(b.name, a.name, weight=round(w, 6), phrases=" | ".join(phrases))
+                # equal locations → skip
+            else:
+                G.add_edge(a.name, b.name, weight=round(w, 6), phrases=" | ".join(phrases))
         
-        return G
+        return G if backend == "networkx" else G.build()
+
+    def iter_story_build(self,
+                         motifs: Optional[List[str]] = None,
+                         motif_weight: float = 0.5,
+                         motif_rarity_alpha: float = 1.0,
+                         min_k: int = 3,
+                         jaccard_min: Optional[float] = None,
+                         weight_threshold: float = 0.0,
+                         directed: bool = False,
+                         mode: str = "snapshot"):
+        """
+        Stream the phrase + motif graph in story order (song_location; songs without
+        one are skipped). Step t adds song t, matches it only against the earlier
+        songs and updates motif document frequencies. A pair without shared motifs
+        gets its final weight when matched and is not kept; pairs sharing motifs are
+        re-weighted from cached phrase scores and min-TFs whenever one of their
+        motifs' IDF moves, and only those re-weighted pairs enter the step's diff.
+        No pair is matched twice.
+        Yields (song name, graph copy) for mode="snapshot", or (song name, diff) for
+        mode="diff" with diff = {"added": [(u, v, attrs)], "changed": [(u, v, attrs)],
+        "removed": [(u, v)]}. The last snapshot equals create_song_graph_with_motifs
+        over the prefix (the IDF uses N = number of songs streamed so far).
+        """
+        if mode not in ("snapshot", "diff"):
+            raise ValueError(f"Unknown stream mode: {mode}")
+        motifs = list(motifs or [])
+        motif_tokens = [tokenize(m) for m in motifs]
+        ordered = sorted((s.song_location, i, s) for i, s in enumerate(self.songs) if s.song_location is not None)
+        self.pair_stats = stats = {"pairs": 0, "bound_pruned": 0, "matched": 0}
+
+        # motif IDF only grows up to log(N_final + 1) + 1, which bounds every later motif score
+        idf_max = (math.log(len(ordered) + 1) + 1) ** motif_rarity_alpha
+        rarity_max = idf_max ** motif_rarity_alpha
+
+        G = nx.DiGraph() if directed else nx.Graph()
+        doc_count = [0] * len(motifs)
+        tf: Dict[str, List[int]] = {}
+        live = []        # pairs sharing motifs: (earlier, later, phrase score, phrases, [(motif idx, min tf)], denom)
+        by_motif = [[] for _ in motifs]   # motif idx -> indices into live
+        idf_prev = [None] * len(motifs)
+        edges = {}       # (u, v) -> attrs
+        diff = None
+        streamed = []
+
+        def put(u, v, attrs):
+            # attrs None: the pair is (now) below the threshold
+            old = edges.get((u, v))
+            if attrs is None:
+                if old is not None:
+                    del edges[(u, v)]
+                    G.remove_edge(u, v)
+                    diff["removed"].append((u, v))
+                return
+            if old is None:
+                diff["added"].append((u, v, attrs))
+            elif old != attrs:
+                diff["changed"].append((u, v, attrs))
+            else:
+                return
+            edges[(u, v)] = attrs
+            G.add_edge(u, v, **attrs)
+
+        for _, _, song in ordered:
+            diff = {"added": [], "changed": [], "removed": []}
+            counts = [_count_ngram_occurrences(song.tokens_cache, mt) for mt in motif_tokens]
+            tf[song.name] = counts
+            for k, c in enumerate(counts):
+                if c > 0:
+                    doc_count[k] += 1
+            G.add_node(song.name, act=song.act_number, order=song.song_location)
+
+            dirty = set()
+            for prev in streamed:
+                stats["pairs"] += 1
+                shared = [(k, min(c, counts[k])) for k, c in enumerate(tf[prev.name]) if c and counts[k]]
+                denom = max(1, min(prev.token_count, song.token_count))
+                ms_max = sum(rarity_max * t for _, t in shared) / denom
+                phrase_thr = weight_threshold - motif_weight * ms_max - 1e-9
+                phrase_score, phrases = prev.connection_to(song, min_k=min_k, jaccard_min=jaccard_min,
+                                                           weight_threshold=phrase_thr, stats=stats)
+                if shared:
+                    dirty.add(len(live))
+                    for k, _ in shared:
+                        by_motif[k].append(len(live))
+                    live.append((prev, song, phrase_score, phrases, shared, denom))
+                elif phrase_score > 0 and phrase_score >= weight_threshold:
+                    # no motif term: the weight is final as soon as the pair is matched
+                    put(prev.name, song.name, {"weight": round(phrase_score, 6), "phrases": " | ".join(phrases)})
+            streamed.append(song)
+
+            # same expressions (and summation order) as _compute_motif_tfidf/_motif_score
+            N = len(streamed)
+            idf = [(math.log((N + 1) / (1 + n_k)) + 1) ** motif_rarity_alpha for n_k in doc_count]
+            for k in range(len(motifs)):
+                if idf[k] != idf_prev[k]:
+                    dirty.update(by_motif[k])
+            idf_prev = idf
+            for p in sorted(dirty):
+                a, b, phrase_score, phrases, shared, denom = live[p]
+                total = 0.0
+                for k, t in shared:
+                    total += idf[k] ** motif_rarity_alpha * t
+                w = phrase_score + motif_weight * (total / denom)
+                attrs = None
+                if w > 0 and w >= weight_threshold:
+                    attrs = {"weight": round(w, 6), "phrases": " | ".join(phrases + [motifs[k] for k, _ in shared])}
+                put(a.name, b.name, attrs)
+            yield song.name, (G.copy() if mode == "snapshot" else diff)
@@ -0,0 +1,318 @@
+import json
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from multiprocessing import get_context
+from typing import Dict, List, Optional
+
+from Classes.Musical import Musical, _motif_score
+from Classes.TokenStore import TokenStore
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS config (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS tiles (
+    id          INTEGER PRIMARY KEY,
+    i0          INTEGER NOT NULL,
+    i1          INTEGER NOT NULL,
+    j0          INTEGER NOT NULL,
+    j1          INTEGER NOT NULL,
+    status      TEXT    NOT NULL DEFAULT 'pending',   -- pending | leased | done
+    owner       TEXT,
+    lease_until REAL,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    path        TEXT
+);
+CREATE INDEX IF NOT EXISTS tiles_status ON tiles (status, lease_until);
+"""
+
+
+class PairQueue:
+    """
+    SQLite-backed work queue for the pairwise scoring of Musical graphs.
+
+    The coordinator (create) splits the song-pair space into tiles of
+    tile_size x tile_size song indices and stores them, together with the
+    build config, in one SQLite file on a filesystem every worker can reach.
+    Workers (run_worker) claim a tile under a time-limited lease, score its
+    pairs, write them to a partial edge file (tile-<id>.jsonl, atomic rename)
+    and mark the tile done. A tile whose lease expires (crashed or stalled
+    worker) goes back to the pool, and re-running a tile rewrites the same
+    file, so the queue can be restarted at any point. The songs' tokens are
+    published once as a token store (out_dir/tokens.bin) that workers map
+    instead of re-reading and re-preprocessing the song files. merge() turns the
+    partial files into the same graph the in-process builder returns.
+    The database uses SQLite's rollback journal (not WAL, whose shared-memory
+    index only works for processes on one host), so the shared filesystem
+    only has to provide working file locks.
+    """
+    def __init__(self, db_path: str, timeout: float = 60.0):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, timeout=timeout, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=DELETE")
+        self.conn.executescript(_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    # ---------- coordinator ----------
+    @classmethod
+    def create(cls, db_path: str, musical: Musical, out_dir: str, tile_size: int = 8,
+               kind: str = "motifs", motifs: Optional[List[str]] = None, motif_weight: float = 0.5,
+               motif_rarity_alpha: float = 1.0, min_k: int = 3, jaccard_min: Optional[float] = None,
+               weight_threshold: float = 0.0, directed: bool = False,
+               early_exit: bool = True) -> "PairQueue":
+        """
+        Publish the tiles of `musical` (kind "phrase" or "motifs", same parameters
+        as the matching builder). Re-creating with the same config resumes the
+        existing queue; a different config raises ValueError.
+        """
+        if kind not in ("phrase", "motifs"):
+            raise ValueError(f"Unknown pair queue kind: {kind}")
+        if tile_size < 1:
+            raise ValueError(f"tile_size must be >= 1, got {tile_size}")
+        config = {
+            "base_dir": os.path.abspath(musical.base_dir),
+            "song_order": musical.song_order,
+            "act_split": musical.act_split,
+            "names": [os.path.basename(s.filepath) for s in musical.songs],
+            "out_dir": os.path.abspath(out_dir),
+            "token_store": os.path.join(os.path.abspath(out_dir), "tokens.bin"),
+            "tile_size": tile_size,
+            "kind": kind,
+            "motifs": list(motifs or []),
+            "motif_weight": motif_weight,
+            "motif_rarity_alpha": motif_rarity_alpha,
+            "min_k": min_k,
+            "jaccard_min": jaccard_min,
+            "weight_threshold": weight_threshold,
+            "directed": directed,
+            "early_exit": early_exit,
+        }
+        q = cls(db_path)
+        q.conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = q.conn.execute("SELECT value FROM config WHERE key = 'build'").fetchone()
+            if row is not None:
+                if json.loads(row[0]) != config:
+                    raise ValueError(f"{db_path} already holds a queue with a different config.")
+            else:
+                os.makedirs(config["out_dir"], exist_ok=True)
+                # written before the config is visible, so every worker finds it
+                TokenStore.write(config["token_store"], ((s.name, s.tokens_cache) for s in musical.songs),
+                                 meta={"songs": musical._song_entries()}, **musical._song_layouts()).close()
+                q.conn.execute("INSERT INTO config VALUES ('build', ?)", (json.dumps(config),))
+                n = len(config["names"])
+                starts = range(0, n, tile_size)
+                q.conn.executemany(
+                    "INSERT INTO tiles (i0, i1, j0, j1) VALUES (?, ?, ?, ?)",
+                    [(a, min(a + tile_size, n), b, min(b + tile_size, n))
+                     for a in starts for b in starts if b >= a]
+                )
+            q.conn.execute("COMMIT")
+        except BaseException:
+            q.conn.execute("ROLLBACK")
+            q.close()
+            raise
+        os.makedirs(config["out_dir"], exist_ok=True)
+        return q
+
+    @property
+    def config(self) -> dict:
+        row = self.conn.execute("SELECT value FROM config WHERE key = 'build'").fetchone()
+        if row is None:
+            raise ValueError(f"{self.db_path} has no published build.")
+        return json.loads(row[0])
+
+    def progress(self) -> Dict[str, int]:
+        out = {"pending": 0, "leased": 0, "done": 0}
+        for status, count in self.conn.execute("SELECT status, COUNT(*) FROM tiles GROUP BY status"):
+            out[status] = count
+        return out
+
+    # ---------- leases ----------
+    def claim(self, owner: str, lease_seconds: float = 300.0) -> Optional[tuple]:
+        """Lease one pending (or expired) tile: (id, i0, i1, j0, j1), or None when nothing is left."""
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.conn.execute(
+                "SELECT id, i0, i1, j0, j1 FROM tiles "
+                "WHERE status = 'pending' OR (status = 'leased' AND lease_until < ?) "
+                "ORDER BY id LIMIT 1", (now,)
+            ).fetchone()
+            if row is not None:
+                self.conn.execute(
+                    "UPDATE tiles SET status = 'leased', owner = ?, lease_until = ?, "
+                    "attempts = attempts + 1 WHERE id = ?", (owner, now + lease_seconds, row[0])
+                )
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        return row
+
+    def renew(self, tile_id: int, owner: str, lease_seconds: float = 300.0) -> bool:
+        """Extend a lease; False if the tile was taken over (lease expired) meanwhile."""
+        cur = self.conn.execute(
+            "UPDATE tiles SET lease_until = ? WHERE id = ? AND owner = ? AND status = 'leased'",
+            (time.time() + lease_seconds, tile_id, owner)
+        )
+        return cur.rowcount == 1
+
+    def complete(self, tile_id: int, owner: str, path: str):
+        # results are deterministic, so a late finisher whose lease was taken over may still close the tile
+        self.conn.execute(
+            "UPDATE tiles SET status = 'done', owner = ?, lease_until = NULL, path = ? WHERE id = ?",
+            (owner, path, tile_id)
+        )
+
+    def release(self, tile_id: int, owner: str):
+        """Give a leased tile back to the pool (e.g. on a worker error)."""
+        self.conn.execute(
+            "UPDATE tiles SET status = 'pending', owner = NULL, lease_until = NULL "
+            "WHERE id = ? AND owner = ? AND status = 'leased'", (tile_id, owner)
+        )
+
+    # ---------- merge ----------
+    def merge(self, musical: Optional[Musical] = None, backend: str = "networkx"):
+        """
+        Build the final graph from the partial edge files of all tiles. Raises
+        ValueError while tiles are still pending or leased.
+        """
+        progress = self.progress()
+        if progress["pending"] or progress["leased"]:
+            raise ValueError(f"Tiles not finished yet: {progress}")
+        cfg = self.config
+        musical = musical or _load_musical(cfg)
+        songs = musical.songs
+        rows = []
+        for (path,) in self.conn.execute("SELECT path FROM tiles ORDER BY id"):
+            with open(path, "r", encoding="utf8") as f:
+                rows.extend(json.loads(line) for line in f if line.strip())
+        rows.sort(key=lambda r: (r[0], r[1]))
+
+        G = musical._new_graph(cfg["directed"], backend)
+        for i, j, w, phrases in rows:
+            a, b = songs[i], songs[j]
+            if cfg["kind"] == "phrase":
+                G.add_edge(a.name, b.name, weight=w)
+                if cfg["directed"]:
+                    G.add_edge(b.name, a.name, weight=w)
+            elif cfg["directed"]:
+                # orient earlier → later; break ties by index (as create_song_graph_with_motifs)
+                if (a.song_location, i) < (b.song_location, j):
+                    G.add_edge(a.name, b.name, weight=w, phrases=phrases)
+                else:
+                    G.add_edge(b.name, a.name, weight=w, phrases=phrases)
+            else:
+                G.add_edge(a.name, b.name, weight=w, phrases=phrases)
+        return G if backend == "networkx" else G.build()
+
+
+# ----------------------------
+# Workers
+# ----------------------------
+def _load_musical(cfg: dict) -> Musical:
+    # songs whose file changed since create() are re-read (load_songs checks the signatures)
+    musical = Musical(cfg["base_dir"], song_order=cfg["song_order"], act_split=cfg["act_split"])
+    musical.load_songs(cfg["names"], lazy=True, token_store_path=cfg.get("token_store"))
+    return musical
+
+
+def _score_tile(musical: Musical, cfg: dict, motif_idf, pairs, heartbeat=None):
+    """
+    [i, j, weight, phrases] rows of the tile, with the builders' threshold rules.
+    heartbeat() (if given) is called before each pair.
+    """
+    songs = musical.songs
+    thr = cfg["weight_threshold"]
+    out = []
+    for i, j in pairs:
+        if heartbeat is not None:
+            heartbeat()
+        a, b = songs[i], songs[j]
+        if cfg["kind"] == "phrase":
+            if a.name == b.name:
+                continue
+            w, _ = a.connection_to(b, min_k=cfg["min_k"], jaccard_min=cfg["jaccard_min"],
+                                   weight_threshold=thr if cfg["early_exit"] else None)
+            if w >= thr:
+                out.append([i, j, w, None])
+            continue
+        if cfg["directed"] and (a.song_location is None or b.song_location is None):
+            continue
+        motif_score, motif_hits = _motif_score(a, b, motifs=cfg["motifs"], idf=motif_idf,
+                                               rarity_alpha=cfg["motif_rarity_alpha"])
+        phrase_thr = (thr - cfg["motif_weight"] * motif_score - 1e-9) if cfg["early_exit"] else None
+        phrase_score, phrases = a.connection_to(b, min_k=cfg["min_k"], jaccard_min=cfg["jaccard_min"],
+                                                weight_threshold=phrase_thr)
+        w = phrase_score + cfg["motif_weight"] * motif_score
+        if w <= 0 or w < thr:
+            continue
+        out.append([i, j, round(w, 6), " | ".join(phrases + motif_hits)])
+    return out
+
+
+def run_worker(db_path: str, owner: Optional[str] = None, lease_seconds: float = 300.0,
+               max_tiles: Optional[int] = None) -> int:
+    """
+    Claim and score tiles until the queue is drained (or max_tiles are done).
+    Safe to start on any node that sees db_path and the song files; returns the
+    number of tiles this worker completed. The lease of the tile being scored is
+    renewed every lease_seconds / 3, so slow tiles are not handed out again.
+    """
+    owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    q = PairQueue(db_path)
+    try:
+        cfg = q.config
+        musical = _load_musical(cfg)
+        motif_idf = None
+        if cfg["kind"] == "motifs":
+            _, motif_idf = musical._compute_motif_tfidf(cfg["motifs"], rarity_alpha=cfg["motif_rarity_alpha"])
+        done = 0
+        while max_tiles is None or done < max_tiles:
+            tile = q.claim(owner, lease_seconds)
+            if tile is None:
+                break
+            tile_id, i0, i1, j0, j1 = tile
+            renewed = time.time()
+
+            def heartbeat():
+                nonlocal renewed
+                if time.time() - renewed >= lease_seconds / 3:
+                    # a False return means the lease had already expired and the tile was
+                    # re-claimed; finishing anyway is harmless (results are deterministic)
+                    q.renew(tile_id, owner, lease_seconds)
+                    renewed = time.time()
+
+            try:
+                pairs = [(i, j) for i in range(i0, i1) for j in range(max(j0, i + 1), j1)]
+                rows = _score_tile(musical, cfg, motif_idf, pairs, heartbeat)
+                path = os.path.join(cfg["out_dir"], f"tile-{tile_id}.jsonl")
+                tmp = f"{path}.{owner.replace(':', '_')}.tmp"
+                with open(tmp, "w", encoding="utf8") as f:
+                    for row in rows:
+                        f.write(json.dumps(row) + "\n")
+                os.replace(tmp, path)
+            except BaseException:
+                q.release(tile_id, owner)
+                raise
+            q.complete(tile_id, owner, path)
+            done += 1
+        return done
+    finally:
+        q.close()
+
+
+def run_local_workers(db_path: str, processes: int = 2, lease_seconds: float = 300.0) -> List[int]:
+    """Run `processes` workers on this machine (separate processes) and wait; returns exit codes."""
+    ctx = get_context("spawn")
+    procs = [ctx.Process(target=run_worker, args=(db_path,), kwargs={"lease_seconds": lease_seconds})
+             for _ in range(processes)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    return [p.exitcode for p in procs]
@@ -0,0 +1,82 @@
+import math
+from typing import Dict, List, Sequence
+
+
+class PhraseIndex:
+    """
+    Document frequency of every token phrase of a corpus, from one index pass.
+
+    Built as a generalized suffix automaton over the songs' token lists: each
+    state stands for a set of phrases that occur in exactly the same songs, and
+    after construction one walk per song (following suffix links, each state
+    visited once per song) stores how many distinct songs contain the state's
+    phrases. df(phrase) is then a walk of len(phrase) transitions, with no scan
+    over the songs.
+    """
+    def __init__(self, docs: Sequence[Sequence[str]]):
+        self._next: List[Dict[str, int]] = [{}]
+        self._link: List[int] = [-1]
+        self._len: List[int] = [0]
+        for tokens in docs:
+            last = 0
+            for t in tokens:
+                last = self._extend(last, t)
+        self.n_docs = len(docs)
+
+        self._df = [0] * len(self._next)
+        seen = [-1] * len(self._next)
+        for d, tokens in enumerate(docs):
+            state = 0
+            for t in tokens:
+                state = self._next[state][t]
+                v = state
+                while v > 0 and seen[v] != d:
+                    seen[v] = d
+                    self._df[v] += 1
+                    v = self._link[v]
+
+    def __len__(self):
+        return len(self._next)
+
+    def _new_state(self, length: int, nxt: Dict[str, int], link: int) -> int:
+        self._next.append(nxt)
+        self._len.append(length)
+        self._link.append(link)
+        return len(self._next) - 1
+
+    def _clone(self, p: int, q: int, c: str) -> int:
+        clone = self._new_state(self._len[p] + 1, dict(self._next[q]), self._link[q])
+        while p != -1 and self._next[p].get(c) == q:
+            self._next[p][c] = clone
+            p = self._link[p]
+        self._link[q] = clone
+        return clone
+
+    def _extend(self, last: int, c: str) -> int:
+        nxt, length = self._next, self._len
+        q = nxt[last].get(c)
+        if q is not None:
+            # phrase already seen in an earlier song: reuse (or split off) its state
+            return q if length[last] + 1 == length[q] else self._clone(last, q, c)
+        cur = self._new_state(length[last] + 1, {}, 0)
+        p = last
+        while p != -1 and c not in nxt[p]:
+            nxt[p][c] = cur
+            p = self._link[p]
+        if p != -1:
+            q = nxt[p][c]
+            self._link[cur] = q if length[p] + 1 == length[q] else self._clone(p, q, c)
+        return cur
+
+    def df(self, tokens: Sequence[str]) -> int:
+        """Number of songs containing `tokens` as a contiguous phrase."""
+        v = 0
+        for t in tokens:
+            v = self._next[v].get(t)
+            if v is None:
+                return 0
+        return self._df[v] if tokens else self.n_docs
+
+    def idf(self, tokens: Sequence[str], alpha: float = 1.0) -> float:
+        """Smoothed IDF as for motifs: (log((N + 1) / (1 + df)) + 1) ** alpha."""
+        return (math.log((self.n_docs + 1) / (1 + self.df(tokens))) + 1) ** alpha
@@ -0,0 +1,176 @@
+import asyncio
+import itertools
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from Classes.HamiltonSong import HamiltonSong
+
+
+# ----------------------------
+# Worker side (process pool)
+# ----------------------------
+# service id -> {song name: song}; keyed by service so that thread-mode services
+# (processes=0) sharing this process do not overwrite each other's songs
+_WORKER_SONGS: Dict[int, Dict[str, HamiltonSong]] = {}
+_SERVICE_IDS = itertools.count()
+
+
+def _init_worker(service_id: int, songs: List[HamiltonSong]):
+    # songs are shipped once per worker; tasks then only carry names
+    _WORKER_SONGS[service_id] = {s.name: s for s in songs}
+
+
+def _score_pair(service_id: int, a: str, b: str, min_k: int, jaccard_min: Optional[float]):
+    songs = _WORKER_SONGS[service_id]
+    w, phrases = songs[a].connection_to(songs[b], min_k=min_k, jaccard_min=jaccard_min)
+    return w, phrases
+
+
+def _retrieve(task: asyncio.Task):
+    # waiters re-raise a failure; mark it retrieved so one with no waiters left is not logged
+    if not task.cancelled():
+        task.exception()
+
+
+class SimilarityService:
+    """
+    Asyncio front-end for on-demand song-pair similarity over a Musical.
+
+    - query()/query_batch() return {"a", "b", "weight", "phrases"} per pair
+    - concurrent requests for the same (unordered) pair share one computation
+    - results are kept in an LRU cache of `cache_size` pairs
+    - misses run connection_to() in a process pool (processes > 0) or, with
+      processes=0, in a thread of the running loop (handy for local testing)
+    - songs backed by a token store are sent to the workers by reference and
+      read from the memory-mapped store there (see Musical.build_token_store)
+    """
+    def __init__(self, musical, min_k: int = 3, jaccard_min: Optional[float] = None,
+                 cache_size: int = 4096, processes: Optional[int] = None):
+        self.min_k = min_k
+        self.jaccard_min = jaccard_min
+        self.cache_size = cache_size
+        self.processes = processes
+        self._id = next(_SERVICE_IDS)
+
+        # store-backed songs reach the workers as (store path, name) and are decoded
+        # from the shared mapping there; materialize the others once so workers
+        # receive tokens, not file paths
+        for s in musical.songs:
+            if not s.store_backed:
+                s.ensure_loaded()
+        self._songs = {s.name: s for s in musical.songs}
+
+        self._cache: "OrderedDict[Tuple[str, str], dict]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+        self._executor: Optional[Executor] = None
+
+        # counters
+        self._started = time.perf_counter()
+        self.requests = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+        self.computed = 0
+        self.errors = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+        self._compute_total = 0.0
+
+    # ---------- lifecycle ----------
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            songs = list(self._songs.values())
+            if self.processes == 0:
+                self._executor = ThreadPoolExecutor(max_workers=1, initializer=_init_worker,
+                                                    initargs=(self._id, songs))
+            else:
+                self._executor = ProcessPoolExecutor(max_workers=self.processes, initializer=_init_worker,
+                                                     initargs=(self._id, songs))
+        return self._executor
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+            _WORKER_SONGS.pop(self._id, None)   # thread mode only; no-op for process pools
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    # ---------- queries ----------
+    def _key(self, a: str, b: str) -> Tuple[str, str]:
+        for name in (a, b):
+            if name not in self._songs:
+                raise ValueError(f"Unknown song: {name}")
+        # connection_to is symmetric, so one cache entry serves both orders
+        return (a, b) if a <= b else (b, a)
+
+    async def query(self, a: str, b: str) -> dict:
+        """How connected are songs a and b, and through which phrases?"""
+        t0 = time.perf_counter()
+        self.requests += 1
+        try:
+            key = self._key(a, b)
+            hit = self._cache.get(key)
+            if hit is not None:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+                res = hit
+            elif key in self._inflight:
+                self.coalesced += 1
+                res = await asyncio.shield(self._inflight[key])
+            else:
+                # the computation is its own task: cancelling any caller (first one
+                # included) only cancels that caller's wait, never the shared result
+                task = asyncio.ensure_future(self._compute(key))
+                task.add_done_callback(_retrieve)
+                self._inflight[key] = task
+                res = await asyncio.shield(task)
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            dt = time.perf_counter() - t0
+            self._latency_total += dt
+            self._latency_max = max(self._latency_max, dt)
+        return {"a": a, "b": b, "weight": res["weight"], "phrases": list(res["phrases"])}
+
+    async def query_batch(self, pairs: Iterable[Tuple[str, str]]) -> List[dict]:
+        return await asyncio.gather(*(self.query(a, b) for a, b in pairs))
+
+    async def _compute(self, key: Tuple[str, str]) -> dict:
+        loop = asyncio.get_running_loop()
+        t0 = time.perf_counter()
+        try:
+            w, phrases = await loop.run_in_executor(
+                self._get_executor(), _score_pair, self._id, key[0], key[1], self.min_k, self.jaccard_min
+            )
+            res = {"weight": w, "phrases": tuple(phrases)}
+            self.computed += 1
+            self._compute_total += time.perf_counter() - t0
+            self._cache[key] = res
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            return res
+        finally:
+            del self._inflight[key]
+
+    # ---------- counters ----------
+    def stats(self) -> dict:
+        elapsed = max(time.perf_counter() - self._started, 1e-9)
+        return {
+            "requests": self.requests,
+            "cache_hits": self.cache_hits,
+            "coalesced": self.coalesced,
+            "computed": self.computed,
+            "errors": self.errors,
+            "cache_size": len(self._cache),
+            "avg_latency_s": self._latency_total / self.requests if self.requests else 0.0,
+            "max_latency_s": self._latency_max,
+            "avg_compute_s": self._compute_total / self.computed if self.computed else 0.0,
+            "throughput_qps": self.requests / elapsed,
+        }
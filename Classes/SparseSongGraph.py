@@ -0,0 +1,146 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import networkx as nx
+import numpy as np
+
+try:
+    from scipy import sparse
+    from scipy.sparse.csgraph import connected_components as _cc
+except ImportError:  # optional dependency: only needed for backend="sparse"
+    sparse = None
+    _cc = None
+
+
+class SparseSongGraph:
+    """
+    Song graph stored as a SciPy CSR weight matrix plus node metadata arrays.
+
+    - names[i], act[i], order[i] describe node i (order is NaN when unknown)
+    - weights[i, j] is the edge weight (both triangles are filled when undirected)
+    - phrases optionally maps (name_u, name_v) -> " | "-joined phrase string
+    Components, act slicing and thresholding are array operations; call
+    to_networkx() only when a networkx graph is actually needed.
+    """
+    def __init__(self, names: Sequence[str], act, order, weights, directed: bool,
+                 phrases: Optional[Dict[Tuple[str, str], str]] = None):
+        if sparse is None:
+            raise ImportError("SparseSongGraph requires scipy (pip install scipy).")
+        self.names = list(names)
+        self.act = np.asarray(act)
+        self.order = np.asarray(order, dtype=float)
+        self.weights = sparse.csr_matrix(weights)
+        self.directed = directed
+        self.phrases = phrases
+
+    def __repr__(self):
+        return f"SparseSongGraph(nodes={len(self.names)}, edges={self.number_of_edges()}, directed={self.directed})"
+
+    # ---------- construction ----------
+    @classmethod
+    def builder(cls, songs, directed: bool = False) -> "SparseGraphBuilder":
+        return SparseGraphBuilder(songs, directed)
+
+    @classmethod
+    def from_networkx(cls, G, weight: str = "weight") -> "SparseSongGraph":
+        names = list(G.nodes())
+        act = [G.nodes[n].get("act") for n in names]
+        order = [np.nan if G.nodes[n].get("order") is None else G.nodes[n]["order"] for n in names]
+        if names:
+            W = nx.to_scipy_sparse_array(G, nodelist=names, weight=weight, format="csr")
+        else:
+            W = sparse.csr_matrix((0, 0))   # networkx refuses to convert a graph without nodes
+        phrases = {(u, v): d["phrases"] for u, v, d in G.edges(data=True) if "phrases" in d}
+        return cls(names, act, order, W, G.is_directed(), phrases or None)
+
+    def to_networkx(self):
+        G = nx.DiGraph() if self.directed else nx.Graph()
+        for name, act, order in zip(self.names, self.act.tolist(), self.order.tolist()):
+            G.add_node(name, act=act, order=None if np.isnan(order) else int(order))
+        W = self.weights if self.directed else sparse.triu(self.weights, format="coo")
+        W = W.tocoo()
+        for i, j, w in zip(W.row.tolist(), W.col.tolist(), W.data.tolist()):
+            u, v = self.names[i], self.names[j]
+            attrs = {"weight": w}
+            if self.phrases is not None:
+                ph = self.phrases.get((u, v), self.phrases.get((v, u)) if not self.directed else None)
+                if ph is not None:
+                    attrs["phrases"] = ph
+            G.add_edge(u, v, **attrs)
+        return G
+
+    # ---------- array operations ----------
+    def number_of_nodes(self) -> int:
+        return len(self.names)
+
+    def number_of_edges(self) -> int:
+        return self.weights.nnz if self.directed else sparse.triu(self.weights).nnz
+
+    def subgraph(self, idx) -> "SparseSongGraph":
+        """Slice by a boolean mask or an index array (no networkx copy)."""
+        idx = np.asarray(idx)
+        if idx.dtype == bool:
+            idx = np.flatnonzero(idx)
+        W = self.weights[idx][:, idx]
+        return SparseSongGraph([self.names[i] for i in idx], self.act[idx], self.order[idx],
+                               W, self.directed, self.phrases)
+
+    def act_subgraph(self, act: int) -> "SparseSongGraph":
+        return self.subgraph(self.act == act)
+
+    def threshold(self, min_weight: float) -> "SparseSongGraph":
+        W = self.weights.tocoo()
+        keep = W.data >= min_weight
+        W = sparse.csr_matrix((W.data[keep], (W.row[keep], W.col[keep])), shape=W.shape)
+        return SparseSongGraph(self.names, self.act, self.order, W, self.directed, self.phrases)
+
+    def connected_components(self, connection: str = "weak") -> np.ndarray:
+        """Component label per node (weak/strong only differ for directed graphs)."""
+        _, labels = _cc(self.weights, directed=self.directed, connection=connection)
+        return labels
+
+    def largest_component(self, connection: str = "weak") -> "SparseSongGraph":
+        labels = self.connected_components(connection)
+        if labels.size == 0:
+            return self
+        return self.subgraph(labels == np.bincount(labels).argmax())
+
+
+class SparseGraphBuilder:
+    """
+    Edge sink with the nx.Graph.add_edge signature used by the Musical builders;
+    build() turns the collected COO triplets into a SparseSongGraph.
+    """
+    def __init__(self, songs, directed: bool):
+        self.directed = directed
+        self.names: List[str] = []
+        self._index: Dict[str, int] = {}
+        act, order = [], []
+        for s in songs:
+            if s.name in self._index:
+                continue
+            self._index[s.name] = len(self.names)
+            self.names.append(s.name)
+            act.append(s.act_number)
+            order.append(np.nan if s.song_location is None else s.song_location)
+        self.act, self.order = act, order
+        self.rows: List[int] = []
+        self.cols: List[int] = []
+        self.data: List[float] = []
+        self.phrases: Dict[Tuple[str, str], str] = {}
+
+    def add_edge(self, u: str, v: str, weight: float = 1.0, phrases: Optional[str] = None):
+        i, j = self._index[u], self._index[v]
+        self.rows.append(i)
+        self.cols.append(j)
+        self.data.append(weight)
+        if not self.directed and i != j:
+            self.rows.append(j)
+            self.cols.append(i)
+            self.data.append(weight)
+        if phrases is not None:
+            self.phrases[(u, v)] = phrases
+
+    def build(self) -> SparseSongGraph:
+        n = len(self.names)
+        W = sparse.coo_matrix((self.data, (self.rows, self.cols)), shape=(n, n)).tocsr()
+        return SparseSongGraph(self.names, self.act, self.order, W, self.directed, self.phrases or None)
@@ -0,0 +1,125 @@
+import json
+import mmap
+from array import array
+import os
+import struct
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class TokenStore:
+    """
+    Read-only, memory-mapped token arrays for a whole corpus.
+
+    File layout:
+        MAGIC (8 bytes) | header_len (uint64 LE) | header JSON (padded to 4 bytes) | native int32 token ids
+    The header holds the vocabulary (id -> token), an offsets table
+    {song name: [start, length]} into the id array, optional per-song line
+    ends (token offset where each lyric line stops) and speaker segments, and
+    an optional free-form `meta` dict (used by Musical snapshots).
+    Every process that opens the same file shares one copy of the ids through
+    the OS page cache; what is shared is the id array only, since songs decode
+    their ids into a private token list on first use (tokens()).
+    """
+    MAGIC = b"HTOKSTR1"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._open()
+
+    def _open(self):
+        self._fh = open(self.path, "rb")
+        self._mm = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:8] != self.MAGIC:
+            self.close()
+            raise ValueError(f"{self.path} is not a token store file.")
+        (header_len,) = struct.unpack_from("<Q", self._mm, 8)
+        header = json.loads(self._mm[16:16 + header_len].decode("utf8"))
+        self.vocab: List[str] = header["vocab"]
+        self.offsets: Dict[str, Tuple[int, int]] = {k: tuple(v) for k, v in header["offsets"].items()}
+        self._line_ends: Dict[str, List[int]] = header.get("line_ends") or {}
+        self._speakers: Dict[str, list] = header.get("speakers") or {}
+        self.meta: dict = header.get("meta") or {}
+        data_start = 16 + header_len
+        self._ids = memoryview(self._mm)[data_start:].cast("i")
+
+    # ---------- pickling: reopen by path in worker processes ----------
+    def __getstate__(self):
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.path = state["path"]
+        self._open()
+
+    def close(self):
+        if getattr(self, "_ids", None) is not None:
+            self._ids.release()
+            self._ids = None
+        if getattr(self, "_mm", None) is not None:
+            self._mm.close()
+            self._mm = None
+        self._fh.close()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.offsets
+
+    def token_ids(self, name: str) -> memoryview:
+        """Zero-copy int32 view of a song's token ids."""
+        start, length = self.offsets[name]
+        return self._ids[start:start + length]
+
+    def tokens(self, name: str) -> List[str]:
+        vocab = self.vocab
+        return [vocab[i] for i in self.token_ids(name)]
+
+    def line_spans(self, name: str) -> Optional[List[Tuple[int, int]]]:
+        """(start, end) token offsets per lyric line, or None if they were not stored."""
+        ends = self._line_ends.get(name)
+        if ends is None:
+            return None
+        return list(zip([0] + ends[:-1], ends))
+
+    def speaker_segments(self, name: str) -> Optional[List[Tuple[int, int, Optional[str]]]]:
+        """(start, end, label) token ranges per speaker tag, or None if they were not stored."""
+        segs = self._speakers.get(name)
+        return None if segs is None else [tuple(seg) for seg in segs]
+
+    @classmethod
+    def write(cls, path: str, songs: Iterable[Tuple[str, List[str]]],
+              vocab: Optional[Dict[str, int]] = None, meta: Optional[dict] = None,
+              line_spans: Optional[Dict[str, List[Tuple[int, int]]]] = None,
+              speaker_segments: Optional[Dict[str, list]] = None) -> "TokenStore":
+        """
+        Write (name, tokens) pairs to `path` and return the opened store.
+        An existing token->id `vocab` is extended in place if given.
+        `line_spans` maps song names to their contiguous (start, end) line spans,
+        `speaker_segments` to their (start, end, label) speaker ranges.
+        `meta` must be JSON-serializable.
+        """
+        vocab = {} if vocab is None else vocab
+        offsets = {}
+        line_ends = {name: [end for _, end in spans] for name, spans in (line_spans or {}).items()}
+        ids = array("i")
+        for name, tokens in songs:
+            start = len(ids)
+            for t in tokens:
+                tid = vocab.get(t)
+                if tid is None:
+                    tid = vocab[t] = len(vocab)
+                ids.append(tid)
+            offsets[name] = [start, len(ids) - start]
+
+        id_to_token = [None] * len(vocab)
+        for t, i in vocab.items():
+            id_to_token[i] = t
+        header = json.dumps({"vocab": id_to_token, "offsets": offsets, "line_ends": line_ends,
+                             "speakers": speaker_segments or {}, "meta": meta or {}}).encode("utf8")
+        header += b" " * (-len(header) % 4)  # keep the int32 array aligned
+
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(cls.MAGIC)
+            f.write(struct.pack("<Q", len(header)))
+            f.write(header)
+            ids.tofile(f)
+        os.replace(tmp, path)
+        return cls(path)
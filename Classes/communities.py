@@ -0,0 +1,79 @@
+import hashlib
+from typing import Dict, Iterable, List, Optional, Set
+
+import networkx as nx
+
+# fingerprint -> {node: community id}; shared by every caller in the process
+_COMMUNITY_CACHE: Dict[str, Dict[str, int]] = {}
+
+
+def graph_fingerprint(G, weight: str = "weight") -> str:
+    """Stable hash of a graph's nodes, edges and edge weights."""
+    h = hashlib.sha1()
+    h.update(b"D" if G.is_directed() else b"U")
+    for n in sorted(map(str, G.nodes())):
+        h.update(n.encode("utf8"))
+        h.update(b"\0")
+    edges = []
+    for u, v, d in G.edges(data=True):
+        u, v = str(u), str(v)
+        if not G.is_directed() and v < u:
+            u, v = v, u
+        edges.append((u, v, repr(d.get(weight, 1.0))))
+    for u, v, w in sorted(edges):
+        h.update(f"{u}\0{v}\0{w}\1".encode("utf8"))
+    return h.hexdigest()
+
+
+def detect_communities(G,
+                       method: str = "louvain",
+                       weight: Optional[str] = "weight",
+                       seed: int = 0,
+                       use_cache: bool = True) -> Dict[str, int]:
+    """
+    Community assignment {node: community id} on the undirected view of G.
+    method: "louvain" (default) or "label_propagation", both near-linear.
+    Ids are ordered by community size (0 = largest) so colors stay stable.
+    Results are cached by graph fingerprint, so repeated renders are free.
+    """
+    key = f"{method}|{weight}|{seed}|{graph_fingerprint(G, weight or 'weight')}"
+    if use_cache and key in _COMMUNITY_CACHE:
+        return _COMMUNITY_CACHE[key]
+
+    und = G.to_undirected() if G.is_directed() else G
+    if und.number_of_nodes() == 0:
+        comms = []
+    elif method == "louvain":
+        comms = nx.algorithms.community.louvain_communities(und, weight=weight, seed=seed)
+    elif method == "label_propagation":
+        comms = nx.algorithms.community.asyn_lpa_communities(und, weight=weight, seed=seed)
+    else:
+        raise ValueError(f"Unknown community method: {method}")
+
+    comms = sorted((set(c) for c in comms), key=lambda c: (-len(c), min(map(str, c))))
+    assignment = {n: cid for cid, comm in enumerate(comms) for n in comm}
+    if use_cache:
+        _COMMUNITY_CACHE[key] = assignment
+    return assignment
+
+
+def project_communities(assignment: Dict[str, int], nodes: Iterable) -> List[Set[str]]:
+    """
+    Restrict a parent-graph assignment to `nodes` (e.g. an act subgraph) without
+    re-running detection. Keeps one (possibly empty) set per parent community so
+    draw_timeline_1 gives each community the same color in every subgraph.
+    Nodes unknown to the parent end up in a trailing set.
+    """
+    n_comms = max(assignment.values(), default=-1) + 1
+    out: List[Set[str]] = [set() for _ in range(n_comms)]
+    extra: Set[str] = set()
+    for n in nodes:
+        cid = assignment.get(n)
+        (extra if cid is None else out[cid]).add(n)
+    if extra:
+        out.append(extra)
+    return out
+
+
+def clear_community_cache():
+    _COMMUNITY_CACHE.clear()
@@ -0,0 +1,89 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Iterable, List, Optional, Tuple
+
+import matplotlib
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from Classes.utils import draw_timeline, draw_timeline_1
+
+_DRAWERS = {"timeline": draw_timeline, "timeline_1": draw_timeline_1}
+
+
+class TimelineRenderer:
+    """
+    Headless timeline rendering to PNG/SVG files.
+
+    Draws on an explicit Agg figure (never pyplot's global one, never plt.show())
+    and reuses that figure across calls: it is cleared, not recreated, so a long
+    batch does not accumulate figures.
+    """
+    def __init__(self, figsize: Tuple[float, float] = (16, 9), dpi: int = 150):
+        self.figsize = figsize
+        self.dpi = dpi
+        self.fig = Figure(figsize=figsize, dpi=dpi)
+        FigureCanvasAgg(self.fig)
+
+    def render(self, G, path: str, drawer: str = "timeline_1",
+               figsize: Optional[Tuple[float, float]] = None, **kwargs) -> str:
+        """Draw G with draw_timeline / draw_timeline_1 and save to `path` (format from extension)."""
+        fig = self.fig
+        fig.clear()
+        fig.set_size_inches(*(figsize or self.figsize))
+        ax = fig.add_subplot(1, 1, 1)
+        _DRAWERS[drawer](G, ax=ax, show=False, **kwargs)
+        out_dir = os.path.dirname(path)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        fig.savefig(path, dpi=self.dpi)
+        fig.clear()
+        return path
+
+
+# ----------------------------
+# Process-pool batch rendering
+# ----------------------------
+_WORKER_RENDERER: Optional[TimelineRenderer] = None
+
+
+def _init_render_worker(figsize, dpi):
+    global _WORKER_RENDERER
+    matplotlib.use("Agg")
+    _WORKER_RENDERER = TimelineRenderer(figsize=figsize, dpi=dpi)
+
+
+def _render_job(G, path, drawer, kwargs):
+    return _WORKER_RENDERER.render(G, path, drawer=drawer, **kwargs)
+
+
+def render_many(jobs: Iterable[Tuple], processes: Optional[int] = None,
+                figsize: Tuple[float, float] = (16, 9), dpi: int = 150,
+                max_pending: Optional[int] = None, max_tasks_per_child: Optional[int] = 50) -> List[str]:
+    """
+    Render many graphs (acts, parameter variants, ...) concurrently.
+
+    jobs: iterable of (G, path) or (G, path, kwargs) or (G, path, kwargs, drawer).
+    Each worker keeps one reusable figure. At most `max_pending` jobs (default
+    2 * workers) are submitted at a time, and workers are recycled every
+    `max_tasks_per_child` jobs, so memory stays bounded for long batches.
+    Returns the written paths in job order.
+    """
+    processes = processes or os.cpu_count() or 1
+    max_pending = max_pending or 2 * processes
+    results = {}
+    pending = {}
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_render_worker,
+                             initargs=(figsize, dpi), max_tasks_per_child=max_tasks_per_child) as ex:
+        for k, job in enumerate(jobs):
+            G, path = job[0], job[1]
+            kwargs = job[2] if len(job) > 2 else {}
+            drawer = job[3] if len(job) > 3 else "timeline_1"
+            if len(pending) >= max_pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    results[pending.pop(fut)] = fut.result()
+            pending[ex.submit(_render_job, G, path, drawer, kwargs)] = k
+        for fut in wait(pending).done:
+            results[pending[fut]] = fut.result()
+    return [results[k] for k in sorted(results)]
@@ -5,23 +5,76 @@ import matplotlib.pyplot as plt
 from itertools import cycle
 import networkx as nx
 
+from Classes.communities import detect_communities, project_communities
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+_TOKEN_RE_NO_APOS = re.compile(r"[a-z0-9]+")
+
+
 def tokenize(s, keep_apostrophes=True):
-    s = s.lower()
-    if keep_apostrophes:
-        s = re.sub(r"[^a-z0-9']+", " ", s)
+    # single findall over the lowered text == sub(non-token chars -> " ").split()
+    pattern = _TOKEN_RE if keep_apostrophes else _TOKEN_RE_NO_APOS
+    return pattern.findall(s.lower())
+
+
+def iter_tokens(s, keep_apostrophes=True, vocab=None, lowered=False):
+    """
+    Generator form of tokenize(): emits tokens lazily from one scan of the text.
+    If `vocab` (dict token -> id) is given, yields interned ids instead of strings,
+    adding unseen tokens to it.
+    Pass lowered=True when `s` is already lowercase to skip the extra copy.
+    """
+    pattern = _TOKEN_RE if keep_apostrophes else _TOKEN_RE_NO_APOS
+    if not lowered:
+        s = s.lower()
+    if vocab is None:
+        for m in pattern.finditer(s):
+            yield m.group()
     else:
-        s = re.sub(r"[^a-z0-9]+", " ", s)
-    return s.split()
+        for m in pattern.finditer(s):
+            tok = m.group()
+            tid = vocab.get(tok)
+            if tid is None:
+                tid = vocab[tok] = len(vocab)
+            yield tid
 
 
-def all_maximal_common_phrases(a_text, b_text, min_k=3, keep_apostrophes=True, jaccard_min=None):
+def all_maximal_common_phrases(a_text, b_text, min_k=3, keep_apostrophes=True, jaccard_min=None,
+                               max_edits=0):
     """
     Return ALL maximal common contiguous token substrings between two texts.
     Now enforces bi-directional maximality and removes phrases contained in others.
     If jaccard_min is set (e.g., 0.9), also drop near-duplicates by Jaccard>=threshold.
+    With max_edits > 0, phrases may differ by up to that many token edits
+    (see fuzzy_common_phrases_tokens).
     """
     A = tokenize(a_text, keep_apostrophes)
     B = tokenize(b_text, keep_apostrophes)
+    if max_edits > 0:
+        return fuzzy_common_phrases_tokens(A, B, min_k=min_k, max_edits=max_edits, jaccard_min=jaccard_min)
+    return all_maximal_common_phrases_tokens(A, B, min_k=min_k, jaccard_min=jaccard_min)
+
+
+def all_maximal_common_phrases_tokens(A, B, min_k=3, jaccard_min=None, a_blocks=None,
+                                      a_lines=None, b_line_index=None):
+    """
+    all_maximal_common_phrases() on already tokenized inputs.
+    If `a_blocks` (from repeat_blocks(A)) is given, DP rows inside repeated blocks
+    of A are copied from their earlier occurrence and only patched where a run
+    crosses into the block, instead of being recomputed; output is identical.
+    If `a_lines` (line token spans of A) and `b_line_index` (line_index() of B)
+    are given, the line-hash prefilter replaces the DP (see _maximal_matches_lines).
+    """
+    if a_lines is not None and b_line_index is not None:
+        matches = _maximal_matches_lines(A, B, min_k, a_lines, b_line_index)
+    elif a_blocks:
+        matches = _maximal_matches_compressed(A, B, min_k, a_blocks)
+    else:
+        matches = _maximal_matches(A, B, min_k)
+    return _group_maximal_matches(A, matches, jaccard_min)
+
+
+def _maximal_matches(A, B, min_k):
     n, m = len(A), len(B)
 
     DP = [[0]*(m+1) for _ in range(n+1)]
@@ -45,7 +98,186 @@ def all_maximal_common_phrases(a_text, b_text, min_k=3, keep_apostrophes=True, j
                     matches.append((L, i, j))
             else:
                 row[j] = 0
+    return matches
+
+
+def line_index(tokens, lines):
+    """Normalized line (token tuple) -> start offsets of its occurrences; `lines` are (start, end) spans."""
+    index = defaultdict(list)
+    for start, end in lines:
+        if end > start:
+            index[tuple(tokens[start:end])].append(start)
+    return dict(index)
+
+
+def _maximal_matches_lines(A, B, min_k, a_lines, b_line_index):
+    """
+    Same (length, a_end, b_end) list as _maximal_matches, without the n*m DP.
+
+    1. hash join of A's lines against B's line index: every identical line pair
+       lies on one maximal diagonal run, which is stitched across line
+       boundaries by extending token by token (once per run, not per line)
+    2. min_k-gram hash join over the rest: a run start (i, j) not already found
+       in step 1 is extended to the right
+    Every maximal run >= min_k starts with an aligned min_k-gram, so nothing is missed.
+    """
+    n, m = len(A), len(B)
+    runs_by_diag = defaultdict(list)   # a_start - b_start -> [(a_start, a_end)]
+    found = set()                      # (a_start, b_start) of runs from step 1
+    matches = []
+
+    for start, end in a_lines:
+        if end <= start:
+            continue
+        for bj in b_line_index.get(tuple(A[start:end]), ()):
+            d = start - bj
+            if any(r0 <= start < r1 for r0, r1 in runs_by_diag[d]):
+                continue
+            i0, i1 = start, end
+            while i0 > 0 and i0 - d > 0 and A[i0 - 1] == B[i0 - d - 1]:
+                i0 -= 1
+            while i1 < n and i1 - d < m and A[i1] == B[i1 - d]:
+                i1 += 1
+            runs_by_diag[d].append((i0, i1))
+            found.add((i0, i0 - d))
+            if i1 - i0 >= min_k:
+                matches.append((i1 - i0, i1, i1 - d))
+
+    index = defaultdict(list)
+    for j in range(m - min_k + 1):
+        index[tuple(B[j:j + min_k])].append(j)
+    for i in range(n - min_k + 1):
+        hits = index.get(tuple(A[i:i + min_k]))
+        if not hits:
+            continue
+        for j in hits:
+            if (i > 0 and j > 0 and A[i - 1] == B[j - 1]) or (i, j) in found:
+                continue
+            L = min_k
+            while i + L < n and j + L < m and A[i + L] == B[j + L]:
+                L += 1
+            matches.append((L, i + L, j + L))
+
+    matches.sort(key=lambda x: (x[1], x[2]))
+    return matches
+
+
+def _maximal_matches_compressed(A, B, min_k, blocks):
+    """
+    Same (length, a_end, b_end) list, in the same order, as _maximal_matches.
+
+    For a block A[s:s+len] == A[src:src+len] (src < s), row s+1+t equals row
+    src+1+t except at columns whose run reaches back to the block start
+    (S_t: B[j-t-1:j] == A[s:s+t+1]); those become t+1 + DP[s][j-t-1]. Row matches
+    are copied too, re-checking right-extendability only where the next token of
+    A differs (the block's last row).
+    """
+    n, m = len(A), len(B)
+    b_pos = defaultdict(list)          # token -> DP columns j with B[j-1] == token
+    for j, tok in enumerate(B, 1):
+        b_pos[tok].append(j)
+
+    DP = [[0]*(m+1) for _ in range(n+1)]
+    row_matches = [[] for _ in range(n+1)]   # sorted columns j of recorded matches per row
+
+    copy_src = {}
+    for start, length, src in blocks:
+        if src is not None:
+            for t in range(length):
+                copy_src[start + t] = (start, t, src + t, length)
+
+    for i in range(1, n+1):
+        ai = A[i-1]
+        row = DP[i]
+        info = copy_src.get(i-1)
+        if info is None:
+            prev = DP[i-1]
+            found = row_matches[i]
+            for j in range(1, m+1):
+                if ai == B[j-1]:
+                    L = prev[j-1] + 1
+                    row[j] = L
+                    if L >= min_k and not (i < n and j < m and A[i] == B[j]):
+                        found.append(j)
+            continue
 
+        start, t, src_tok, length = info
+        r_src = src_tok + 1
+        if t == 0:
+            spanning = b_pos.get(ai, [])
+        else:
+            spanning = [j + 1 for j in spanning if j < m and B[j] == ai]
+        DP[i] = row = DP[r_src][:]
+        base = DP[start]
+        for j in spanning:
+            row[j] = t + 1 + base[j - t - 1]
+
+        span_set = set(spanning)
+        same_next = (t < length - 1) and i < n
+        if same_next:
+            # right-extendability is unchanged for copied columns
+            cand = [j for j in row_matches[r_src] if j not in span_set]
+            cand.extend(spanning)
+            nxt = A[i]
+            found = [j for j in cand if row[j] >= min_k and not (j < m and nxt == B[j])] if cand else []
+        else:
+            cand = set(row_matches[r_src]) | span_set
+            if r_src < n:
+                # columns that extended to the right in the source row (B[j] == A[r_src])
+                cand.update(p - 1 for p in b_pos.get(A[r_src], ()))
+            found = [j for j in cand
+                     if row[j] >= min_k and not (i < n and j < m and A[i] == B[j])]
+        found.sort()
+        row_matches[i] = found
+
+    return [(DP[i][j], i, j) for i in range(1, n+1) for j in row_matches[i]]
+
+
+def repeat_blocks(tokens, min_block=8, q=4, max_candidates=32):
+    """
+    Greedy LZ77-style factorization of a song's own tokens into literal runs and
+    copies of earlier identical blocks (choruses, hooks).
+
+    Uses a q-gram position index over the token suffixes seen so far to find the
+    longest earlier occurrence at each position; copies shorter than `min_block`
+    stay literal. Returns [(start, length, src)] covering tokens in order, with
+    src=None for literal runs.
+    """
+    n = len(tokens)
+    index = defaultdict(list)     # q-gram -> earlier start positions
+    blocks = []
+    lit_start = 0
+    i = 0
+
+    def add_positions(lo, hi):
+        for p in range(lo, min(hi, n - q + 1)):
+            index[tuple(tokens[p:p+q])].append(p)
+
+    while i < n:
+        best_len, best_src = 0, None
+        if i + q <= n:
+            for p in reversed(index.get(tuple(tokens[i:i+q]), [])[-max_candidates:]):
+                L = q
+                while i + L < n and tokens[p + L] == tokens[i + L]:
+                    L += 1
+                if L > best_len:
+                    best_len, best_src = L, p
+        if best_len >= min_block:
+            if lit_start < i:
+                blocks.append((lit_start, i - lit_start, None))
+            blocks.append((i, best_len, best_src))
+            add_positions(i, i + best_len)
+            i += best_len
+            lit_start = i
+        else:
+            add_positions(i, i + 1)
+            i += 1
+    if lit_start < n:
+        blocks.append((lit_start, n - lit_start, None))
+    return blocks
+
+
+def _group_maximal_matches(A, matches, jaccard_min):
     # Group exact-equal phrases; keep all spans
     grouped = defaultdict(lambda: {"length": None, "a_spans": [], "b_spans": []})
     for L, i_end, j_end in matches:
@@ -62,6 +294,10 @@ def all_maximal_common_phrases(a_text, b_text, min_k=3, keep_apostrophes=True, j
         {"phrase": p, "length": info["length"], "a_spans": info["a_spans"], "b_spans": info["b_spans"]}
         for p, info in grouped.items()
     ]
+    return _filter_phrases(results, jaccard_min)
+
+
+def _filter_phrases(results, jaccard_min):
     results.sort(key=lambda x: (-x["length"], x["phrase"]))
 
     # ----- containment filter: drop any phrase contained in a longer kept phrase -----
@@ -99,6 +335,215 @@ def all_maximal_common_phrases(a_text, b_text, min_k=3, keep_apostrophes=True, j
     return {"all_maximal": kept, "longest_len": max_len, "longest_only": longest_only}
 
 
+# ---------- approximate (fuzzy) phrases ----------
+def banded_edit_distance(X, Y, max_edits):
+    """Token edit distance of X and Y if it is <= max_edits, else max_edits + 1 (Ukkonen band)."""
+    n, m, e = len(X), len(Y), max_edits
+    if abs(n - m) > e:
+        return e + 1
+    INF = e + 1
+    prev = [j if j <= e else INF for j in range(m + 1)]
+    for i in range(1, n + 1):
+        lo, hi = max(1, i - e), min(m, i + e)
+        row = [INF] * (m + 1)
+        if i <= e:
+            row[0] = i
+        xi = X[i - 1]
+        best = row[0]
+        for j in range(lo, hi + 1):
+            d = prev[j - 1] + (xi != Y[j - 1])
+            if prev[j] + 1 < d:
+                d = prev[j] + 1
+            if row[j - 1] + 1 < d:
+                d = row[j - 1] + 1
+            row[j] = d if d < INF else INF
+            if d < best:
+                best = d
+        if best > e:
+            return INF
+        prev = row
+    return prev[m]
+
+
+def _extension_profile(A, B, a0, b0, step, e):
+    """
+    Banded alignment of A and B walking away from (a0, b0) in direction `step` (+1/-1).
+    Returns best[c] = (da, db): the longest extension (tokens taken from A, B) that
+    ends on a matching token pair and costs <= c edits, for c = 0..e.
+    """
+    na = len(A) - a0 if step > 0 else a0
+    nb = len(B) - b0 if step > 0 else b0
+    if step > 0:
+        ax, bx = a0 - 1, b0 - 1      # A[ax + i] is the i-th token of the extension
+    else:
+        ax, bx = a0, b0              # A[ax - i]
+    INF = e + 1
+    best = [(0, 0)] * (e + 1)
+    prev = {j: j for j in range(min(nb, e) + 1)}
+    for i in range(1, na + 1):
+        xi = A[ax + i] if step > 0 else A[ax - i]
+        row = {}
+        row_min = INF
+        for j in range(max(0, i - e), min(nb, i + e) + 1):
+            if j == 0:
+                d = i
+            else:
+                diag = prev.get(j - 1, INF)
+                match = xi == (B[bx + j] if step > 0 else B[bx - j])
+                d = diag + (not match)
+                d = min(d, prev.get(j, INF) + 1, row.get(j - 1, INF) + 1)
+                if match and d == diag and d <= e and i + j > sum(best[d]):
+                    best[d] = (i, j)
+            if d < row_min:
+                row_min = d
+            row[j] = d
+        if row_min > e:
+            break
+        prev = row
+    for c in range(1, e + 1):
+        if sum(best[c - 1]) > sum(best[c]):
+            best[c] = best[c - 1]
+    return best
+
+
+def _exact_runs(A, B, q):
+    """Maximal exact common runs of length >= q as (a_start, b_start, length), via a q-gram index of B."""
+    index = defaultdict(list)
+    for j in range(len(B) - q + 1):
+        index[tuple(B[j:j + q])].append(j)
+    runs = []
+    n, m = len(A), len(B)
+    for i in range(n - q + 1):
+        hits = index.get(tuple(A[i:i + q]))
+        if not hits:
+            continue
+        for j in hits:
+            if i > 0 and j > 0 and A[i - 1] == B[j - 1]:
+                continue   # not a run start
+            L = q
+            while i + L < n and j + L < m and A[i + L] == B[j + L]:
+                L += 1
+            runs.append((i, j, L))
+    return runs
+
+
+def fuzzy_common_phrases_tokens(A, B, min_k=3, max_edits=1, jaccard_min=None, q=None):
+    """
+    Maximal common phrases allowing up to `max_edits` token edits (substitution,
+    insertion, deletion); same output as all_maximal_common_phrases_tokens, plus
+    per phrase "edits" and "b_phrase" (B's wording). Phrases are grouped by their
+    (A wording, B wording) pair; "phrase" is A's wording and "length" is
+    min(len A span, len B span).
+
+    Filter: a phrase of >= min_k tokens with <= e edits keeps an exact run of
+    >= ceil((min_k - e) / (e + 1)) tokens (pigeonhole), so only exact runs of that
+    length found through a q-gram index of B are seeds. Verification: each seed
+    is extended both ways with banded edit distance (band e), and the edit
+    budget is split between the two sides to maximize the total length.
+    Phrases start and end on matching tokens. Extension ties depend on which
+    side is walked first, so the regions of both argument orders are merged:
+    swapping A and B swaps the wordings but keeps lengths and edits. With
+    max_edits=0 this is the exact matcher.
+    """
+    e = max_edits
+    if e <= 0:
+        return all_maximal_common_phrases_tokens(A, B, min_k=min_k, jaccard_min=jaccard_min)
+    if q is None:
+        q = max(1, -(-(min_k - e) // (e + 1)))
+
+    spans = _fuzzy_regions(A, B, min_k, e, q)
+    for (b_s, b_e, a_s, a_e), d in _fuzzy_regions(B, A, min_k, e, q).items():
+        spans.setdefault((a_s, a_e, b_s, b_e), d)
+
+    # drop regions nested in a larger one (on both sides); containment is
+    # transitive, so this keeps exactly the maximal regions whatever the order
+    ordered = sorted(spans, key=lambda s: (-(s[1] - s[0] + s[3] - s[2]), s))
+    kept_spans = []
+    for s in ordered:
+        if any(k[0] <= s[0] and s[1] <= k[1] and k[2] <= s[2] and s[3] <= k[3] for k in kept_spans):
+            continue
+        kept_spans.append(s)
+
+    grouped = {}
+    for a_s, a_e, b_s, b_e in sorted(kept_spans):
+        key = (" ".join(A[a_s:a_e]), " ".join(B[b_s:b_e]))
+        g = grouped.get(key)
+        if g is None:
+            # the wordings fix the lengths and the edit distance
+            g = grouped[key] = {"phrase": key[0], "b_phrase": key[1], "length": min(a_e - a_s, b_e - b_s),
+                                "a_spans": [], "b_spans": [], "edits": spans[(a_s, a_e, b_s, b_e)]}
+        g["a_spans"].append((a_s, a_e))
+        g["b_spans"].append((b_s, b_e))
+    return _filter_fuzzy_phrases(list(grouped.values()), jaccard_min)
+
+
+def _fuzzy_regions(A, B, min_k, e, q):
+    """{(a_s, a_e, b_s, b_e): edits} of the extended seeds of fuzzy_common_phrases_tokens."""
+    spans = {}
+    profiles = {}
+    for i, j, L in _exact_runs(A, B, q):
+        key_r, key_l = (i + L, j + L), (i, j)
+        right = profiles.get(("r",) + key_r)
+        if right is None:
+            right = profiles[("r",) + key_r] = _extension_profile(A, B, i + L, j + L, 1, e)
+        left = profiles.get(("l",) + key_l)
+        if left is None:
+            left = profiles[("l",) + key_l] = _extension_profile(A, B, i, j, -1, e)
+        best = None
+        for c in range(e + 1):
+            (ra, rb), (la, lb) = right[c], left[e - c]
+            tot = ra + rb + la + lb
+            if best is None or tot > best[0]:
+                best = (tot, i - la, i + L + ra, j - lb, j + L + rb)
+        _, a_s, a_e, b_s, b_e = best
+        if min(a_e - a_s, b_e - b_s) >= min_k:
+            span = (a_s, a_e, b_s, b_e)
+            if span not in spans:
+                spans[span] = banded_edit_distance(A[a_s:a_e], B[b_s:b_e], e)
+    return spans
+
+
+def _filter_fuzzy_phrases(results, jaccard_min):
+    # _filter_phrases on (A, B) wording pairs, with rules that do not depend on
+    # which song is A: a pair is contained in a kept one only if both wordings
+    # are, and the Jaccard filter compares the token sets of both wordings
+    results.sort(key=lambda x: (-x["length"], sorted((x["phrase"], x["b_phrase"])), x["phrase"]))
+    kept = []
+    for r in results:
+        a_pad, b_pad = f" {r['phrase']} ", f" {r['b_phrase']} "
+        if any(a_pad in f" {k['phrase']} " and b_pad in f" {k['b_phrase']} " for k in kept):
+            continue
+        if jaccard_min is not None:
+            cset = set(r["phrase"].split()) | set(r["b_phrase"].split())
+            if any(len(cset & kset) / (len(cset | kset) or 1) >= jaccard_min
+                   for kset in (set(k["phrase"].split()) | set(k["b_phrase"].split()) for k in kept)):
+                continue
+        kept.append(r)
+
+    max_len = kept[0]["length"] if kept else 0
+    longest_only = [r for r in kept if r["length"] == max_len]
+    return {"all_maximal": kept, "longest_len": max_len, "longest_only": longest_only}
+
+
+def phrase_score_upper_bound(shared_windows, shared_tokens, n, m, min_k=3):
+    """
+    Upper bound on connection_to()'s weight sum(len^2) / min(n, m) without matching.
+
+    shared_windows: sum over common min_k-grams g of countA(g) * countB(g)
+    shared_tokens:  sum over common tokens t of countA(t) * countB(t)
+
+    Every kept phrase is a distinct maximal diagonal run of length L >= min_k, which
+    holds L - min_k + 1 aligned min_k-gram pairs and L matching cells, so
+    sum(L) <= min(min_k * shared_windows, shared_tokens) and
+    L <= min(n, m, shared_windows + min_k - 1); sum(L^2) <= max(L) * sum(L).
+    """
+    if shared_windows <= 0:
+        return 0.0
+    total_len = min(min_k * shared_windows, shared_tokens)
+    max_len = min(n, m, shared_windows + min_k - 1)
+    return max_len * total_len / max(1, min(n, m))
+
+
 def timeline_layout(G, order_attr="order", spacing=1.0, y=0.0):
     nodes_sorted = sorted(
         G.nodes(),
@@ -109,10 +554,10 @@ def timeline_layout(G, order_attr="order", spacing=1.0, y=0.0):
 
 def draw_timeline(G, order_attr="order", spacing=1.0, label_offset=0.18,
                   edge_rad_base=0.15, edge_width_attr="weight",
-                  arcs_above=True, fontsize=9, height=0):
+                  arcs_above=True, fontsize=9, height=0, ax=None, show=True):
 
     pos, nodes_sorted = timeline_layout(G, order_attr=order_attr, spacing=spacing, y=height)
-    ax = plt.gca()
+    ax = ax if ax is not None else plt.gca()
 
     # --- draw EDGES first ---
     sign = -1.0 if arcs_above else 1.0   # negative → arc bends UP
@@ -145,7 +590,7 @@ def draw_timeline(G, order_attr="order", spacing=1.0, label_offset=0.18,
                     a.set_clip_on(False)
 
     # --- draw NODES on top ---
-    nx.draw_networkx_nodes(G, pos, node_size=320, linewidths=0.8, edgecolors="black")
+    nx.draw_networkx_nodes(G, pos, node_size=320, linewidths=0.8, edgecolors="black", ax=ax)
 
     # --- labels: below baseline, 45°
     for n, (x, y) in pos.items():
@@ -162,8 +607,9 @@ def draw_timeline(G, order_attr="order", spacing=1.0, label_offset=0.18,
     ax.set_xlim(min_x - spacing * 0.5, max_x + spacing * 0.5)
     ax.set_ylim(-bottom_pad, top_pad)
     ax.axis("off")
-    plt.tight_layout()
-    plt.show()
+    ax.figure.tight_layout()
+    if show:
+        plt.show()
 
 
 
@@ -185,18 +631,25 @@ def draw_timeline_1(
     fontsize=9,
     height=0,
     # communities coloring
-    communities=None,            # optional: pass in an iterable of sets; if None → detect
+    communities=None,            # optional: iterable of sets or {node: id}; if None → detect
     cmap=None,                    # optional: list/iterable of colors; if None → good defaults
+    # target
+    ax=None,                     # optional: draw on this axes instead of plt.gca()
+    show=True,                   # call plt.show() at the end (False for headless rendering)
 ):
     """
     Timeline layout with node size = degree and spacing coupled to node size.
-    Colors nodes by community (greedy modularity if not provided).
+    Colors nodes by community (cached Louvain via detect_communities if not provided).
+    A {node: community id} mapping computed once on a parent graph can be passed
+    for subgraphs (e.g. acts) so colors match without re-detecting.
 
     Notes:
     - 'gap_per_sqrt_size' is applied to sqrt(points^2) (=points). It's a heuristic but
       works well visually without fighting Matplotlib's unit system.
+    - Pass `ax` and show=False to render without touching pyplot's global state
+      (see Classes.rendering).
     """
-    ax = plt.gca()
+    ax = ax if ax is not None else plt.gca()
 
     # ----- ORDER: get nodes in timeline order
     # If you already have your own 'timeline_layout', keep using it just to get the order.
@@ -230,13 +683,15 @@ def draw_timeline_1(
 
     # ----- COMMUNITIES → colors
     if communities is None:
-        # detect on undirected to match visual intuition
-        und = G.to_undirected()
+        # detect on undirected to match visual intuition (cached by graph fingerprint)
         try:
-            comms = list(nx.algorithms.community.greedy_modularity_communities(und))
+            comms = project_communities(detect_communities(G), G.nodes())
         except Exception:
             # fallback: single community
             comms = [set(G.nodes())]
+    elif isinstance(communities, dict):
+        # {node: community id} from a parent graph → project onto this subgraph
+        comms = project_communities(communities, G.nodes())
     else:
         comms = list(communities)
 
@@ -295,7 +750,7 @@ def draw_timeline_1(
         G, pos,
         node_size=node_sizes,
         node_color=node_colors,
-        linewidths=0.9, edgecolors="black"
+        linewidths=0.9, edgecolors="black", ax=ax
     )
 
     # ----- LABELS: below baseline, 45°
@@ -312,5 +767,6 @@ def draw_timeline_1(
     ax.set_xlim(min_x - 0.6, max_x + 0.6)
     ax.set_ylim(-bottom_pad, top_pad)
     ax.axis("off")
-    plt.tight_layout()
-    plt.show()
+    ax.figure.tight_layout()
+    if show:
+        plt.show()
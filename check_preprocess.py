@@ -0,0 +1,35 @@
+"""
+Equivalence check of the lyric-cleaning fast path: for every song file,
+HamiltonSong.preprocess_text(fast=True) must give the same lyrics and tokens
+as the step-by-step chain (fast=False).
+
+    python check_preprocess.py [songs_dir]
+"""
+import os
+import sys
+
+from Classes.HamiltonSong import HamiltonSong
+
+
+def check(songs_dir: str = "songs") -> list:
+    """Names of the songs whose fast and reference preprocessing differ."""
+    mismatched = []
+    for fname in sorted(os.listdir(songs_dir)):
+        results = []
+        for fast in (True, False):
+            song = HamiltonSong(fname, os.path.join(songs_dir, fname))
+            song.read_file()
+            song.preprocess_text(fast=fast)
+            results.append((song.lyrics, song.tokens_cache))
+        if results[0] != results[1]:
+            mismatched.append(fname)
+    return mismatched
+
+
+if __name__ == "__main__":
+    songs_dir = sys.argv[1] if len(sys.argv) > 1 else "songs"
+    bad = check(songs_dir)
+    for fname in bad:
+        print(f"MISMATCH {fname}")
+    print(f"{len(os.listdir(songs_dir)) - len(bad)}/{len(os.listdir(songs_dir))} songs equivalent")
+    sys.exit(1 if bad else 0)
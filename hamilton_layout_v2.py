@@ -1,8 +1,14 @@
 
 from PIL import Image, ImageDraw, ImageFont
 from collections import defaultdict
+from multiprocessing import get_all_start_methods, get_context
 from pathlib import Path
+import hashlib
+import json
 import math
+import os
+import struct
+import zlib
 
 W, H = 1800, 1100
 LEFT_PAD, RIGHT_PAD = 100, 100
@@ -20,9 +26,26 @@ K_REPEL  = 1200.0
 DAMP     = 0.88
 STEPS    = 1400
 MIN_GAP  = 80.0
+TOL      = 1e-3     # stop once no node moves more than this per step
 
 ONLY_SAME_LANE = True
 
+# warm start: solved positions + per-lane-group signatures from the last run;
+# groups whose nodes/edges did not change are reused, the others are relaxed
+# starting from their previous positions
+WARM_START = True
+LAYOUT_CACHE = Path(__file__).with_name("hamilton_layout_v2.layout.json")
+
+# rendering: the canvas is drawn as TILE x TILE tiles in worker processes and
+# streamed to the PNG one band of tiles at a time, so memory follows the tile
+# size, not the canvas; RENDER_SCALE > 1 gives poster-size output
+OUT_PATH = Path("/hamilton_layout_v2.png")
+RENDER_SCALE = 1
+TILE = 512
+RENDER_PROCESSES = os.cpu_count() or 1
+AVOID_LABEL_OVERLAP = True
+MAX_LABEL_LEVELS = 3
+
 RAW_NODES = [
 ("Best of Wives and Best of Women", 0),
 ("It's Quiet Uptown", 0),
@@ -212,36 +235,98 @@ for lane, idxs in lane_to_indices.items():
         edges.append((a, b, 110.0, "ORDER"))
 
 # Solver
-vx = [0.0]*len(nodes)
-for step in range(STEPS):
-    fx = [0.0]*len(nodes)
-
-    for i, j, target, kind in edges:
-        ni, nj = nodes[i], nodes[j]
-        dx = nj["x"] - ni["x"]
-        dist = abs(dx) + 1e-9
-        k = K_ORDER if kind == "ORDER" else K_SPRING
-        force = k * (dist - target)
-        dirx = 1.0 if dx >= 0 else -1.0
-        fx[i] += force * dirx
-        fx[j] -= force * dirx
-
-    for lane, idxs in lane_to_indices.items():
-        for a in range(len(idxs)):
-            for b in range(a+1, len(idxs)):
-                i, j = idxs[a], idxs[b]
-                ni, nj = nodes[i], nodes[j]
-                dx = nj["x"] - ni["x"]
-                dist2 = dx*dx + 0.01
-                rep = K_REPEL / dist2
-                dirx = 1.0 if dx >= 0 else -1.0
-                fx[i] -= rep * dirx
-                fx[j] += rep * dirx
-
-    for i, n in enumerate(nodes):
-        vx[i] = (vx[i] + fx[i]) * DAMP
-        n["x"] += vx[i]
-        n["x"] = max(LEFT_PAD + NODE_R, min(W - RIGHT_PAD - NODE_R, n["x"]))
+def lane_groups():
+    """Lanes coupled by edges (every lane on its own when ONLY_SAME_LANE)."""
+    parent = {lane: lane for lane in lane_to_indices}
+    def find(a):
+        while parent[a] != a:
+            a = parent[a]
+        return a
+    for i, j, _, _ in edges:
+        parent[find(nodes[i]["group"])] = find(nodes[j]["group"])
+    groups = defaultdict(list)
+    for lane in lane_to_indices:
+        groups[find(lane)].append(lane)
+    return [sorted(g) for g in groups.values()]
+
+def group_signature(lanes, group_edges):
+    h = hashlib.sha1()
+    h.update(repr((K_SPRING, K_ORDER, K_REPEL, DAMP, STEPS, TOL, W, LEFT_PAD, RIGHT_PAD, NODE_R)).encode())
+    for lane in lanes:
+        h.update(repr([(nodes[k]["name"], lane, ORDER_RANK[nodes[k]["name"]]) for k in lane_to_indices[lane]]).encode())
+    h.update(repr(sorted((nodes[i]["name"], nodes[j]["name"], round(t, 9), kind)
+                         for i, j, t, kind in group_edges)).encode())
+    return h.hexdigest()
+
+def solve(lanes, group_edges, steps=STEPS, tol=TOL):
+    """Relax the nodes of `lanes` from their current x; returns the number of steps run."""
+    idxs = [k for lane in lanes for k in lane_to_indices[lane]]
+    vx = {k: 0.0 for k in idxs}
+    for step in range(steps):
+        fx = {k: 0.0 for k in idxs}
+
+        for i, j, target, kind in group_edges:
+            ni, nj = nodes[i], nodes[j]
+            dx = nj["x"] - ni["x"]
+            dist = abs(dx) + 1e-9
+            k = K_ORDER if kind == "ORDER" else K_SPRING
+            force = k * (dist - target)
+            dirx = 1.0 if dx >= 0 else -1.0
+            fx[i] += force * dirx
+            fx[j] -= force * dirx
+
+        for lane in lanes:
+            lane_idxs = lane_to_indices[lane]
+            for a in range(len(lane_idxs)):
+                for b in range(a+1, len(lane_idxs)):
+                    i, j = lane_idxs[a], lane_idxs[b]
+                    ni, nj = nodes[i], nodes[j]
+                    dx = nj["x"] - ni["x"]
+                    dist2 = dx*dx + 0.01
+                    rep = K_REPEL / dist2
+                    dirx = 1.0 if dx >= 0 else -1.0
+                    fx[i] -= rep * dirx
+                    fx[j] += rep * dirx
+
+        moved = 0.0
+        for i in idxs:
+            n = nodes[i]
+            vx[i] = (vx[i] + fx[i]) * DAMP
+            old_x = n["x"]
+            n["x"] += vx[i]
+            n["x"] = max(LEFT_PAD + NODE_R, min(W - RIGHT_PAD - NODE_R, n["x"]))
+            moved = max(moved, abs(n["x"] - old_x))
+        if moved < tol:
+            return step + 1
+    return steps
+
+cache = {}
+if WARM_START and LAYOUT_CACHE.exists():
+    try:
+        cache = json.loads(LAYOUT_CACHE.read_text())
+    except ValueError:
+        cache = {}
+prev_x = cache.get("x", {})
+prev_sigs = set(cache.get("groups", []))
+
+sigs, total_steps, relaxed = [], 0, 0
+for lanes in lane_groups():
+    group_edges = [e for e in edges if nodes[e[0]]["group"] in lanes]
+    sig = group_signature(lanes, group_edges)
+    sigs.append(sig)
+    idxs = [k for lane in lanes for k in lane_to_indices[lane]]
+    if sig in prev_sigs and all(nodes[k]["name"] in prev_x for k in idxs):
+        for k in idxs:
+            nodes[k]["x"] = prev_x[nodes[k]["name"]]
+        continue
+    for k in idxs:
+        nodes[k]["x"] = prev_x.get(nodes[k]["name"], nodes[k]["x"])
+    total_steps += solve(lanes, group_edges)
+    relaxed += 1
+print(f"Layout: relaxed {relaxed}/{len(sigs)} lane groups in {total_steps} steps")
+
+if WARM_START:
+    LAYOUT_CACHE.write_text(json.dumps({"x": {n["name"]: n["x"] for n in nodes}, "groups": sigs}))
 
 # Monotone clamp
 for lane, idxs in lane_to_indices.items():
@@ -252,62 +337,211 @@ for lane, idxs in lane_to_indices.items():
         last_x = nodes[k]["x"] + MIN_GAP
 
 # Render
-def load_background():
-    for p in (Path("/mnt/data/58030eae-9fe6-43f2-8f2d-7a049f42d92a.png"),
-              Path("/mnt/data/9c400e32-c9dc-4802-a44e-2b8e88bb9f5b.png")):
-        if p.exists():
-            return Image.open(p).convert("RGBA").resize((W, H))
-    bg = Image.new("RGBA", (W, H), (20,20,20,255))
-    cx, cy = W//2, H//2
+BACKGROUNDS = (Path("/mnt/data/58030eae-9fe6-43f2-8f2d-7a049f42d92a.png"),
+               Path("/mnt/data/9c400e32-c9dc-4802-a44e-2b8e88bb9f5b.png"))
+
+PALETTE = [
+    (82, 186, 255), (140, 233, 154), (250, 176, 5), (255, 121, 97),
+    (110, 64, 170), (255, 214, 102), (84, 160, 255), (255, 99, 132),
+    (100, 181, 246), (255, 167, 38), (171, 71, 188)
+]
+
+def load_font(size):
+    try:
+        return ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", size)
+    except:
+        return ImageFont.load_default()
+
+def place_labels(font, s):
+    """
+    (tx, ty, text) per node. Labels alternate above/below their node; with
+    AVOID_LABEL_OVERLAP a label that would overlap an earlier one in its lane
+    tries the other side, then rows further out (up to MAX_LABEL_LEVELS).
+    """
+    measure = ImageDraw.Draw(Image.new("RGBA", (1, 1)))
+    r = NODE_R * s
+    line_h = measure.textbbox((0, 0), "Hg", font=font)[3] + 4 * s
+    last_right = {}   # (lane, side, level) -> right edge of the last label placed there
+    out = []
+    order = sorted(range(len(nodes)), key=lambda i: nodes[i]["x"]) if AVOID_LABEL_OVERLAP else range(len(nodes))
+    for i in order:
+        n = nodes[i]
+        x, y = n["x"] * s, n["y"] * s
+        label = n["name"].replace(" (Reprise)", "")
+        tb = measure.textbbox((0, 0), label, font=font)
+        tw = tb[2]
+        tx = x - tw/2
+        sides = (-1, 1) if i % 2 == 0 else (1, -1)
+        slots = [(sides[0], 0)]
+        if AVOID_LABEL_OVERLAP:
+            slots = [(side, level) for level in range(MAX_LABEL_LEVELS) for side in sides]
+        side, level = next((sl for sl in slots if last_right.get((n["group"],) + sl, -math.inf) < tx), slots[0])
+        last_right[(n["group"], side, level)] = tx + tw
+        dy = (-r - 6 * s - level * line_h) if side < 0 else (r + 6 * s + level * line_h)
+        out.append((tx, y + dy, label))
+    return out
+
+def build_scene(s):
+    """Everything a tile worker draws, in canvas coordinates (scaled by s)."""
+    font = load_font(FONT_SIZE * s)
+    lanes = [(TOP_PAD + lane * LANE_SPACING) * s for lane in sorted(set(n["group"] for n in nodes))]
+    circles = [(n["x"] * s, n["y"] * s, PALETTE[n["group"] % len(PALETTE)]) for n in nodes]
+    labels = place_labels(font, s)
+    title = "Hamilton – Weighted Proximity (No Edges)"
+    tb = ImageDraw.Draw(Image.new("RGBA", (1, 1))).textbbox((0, 0), title, font=font)
+    measure = ImageDraw.Draw(Image.new("RGBA", (1, 1)))
+    widest = max([tb[2]] + [measure.textbbox((0, 0), t, font=font)[2] for _, _, t in labels])
+    # tiles are drawn with this much room on the left/top, so nothing that touches a tile
+    # is drawn at negative coordinates (PIL rounds those differently, leaving seams)
+    margin = int(max(widest, 2 * NODE_R * s, FONT_SIZE * s * 2)) + 8 * s
+    return {"size": (W * s, H * s), "scale": s, "lanes": lanes, "circles": circles, "labels": labels,
+            "title": (W * s / 2 - tb[2] / 2, 20 * s, title), "text_h": FONT_SIZE * s * 2, "margin": margin}
+
+# --- tile workers (font, palette and scene are set up once per process) ---
+_SCENE = None
+_FONT = None
+_BG_SOURCE = None
+
+def _init_tile_worker(scene):
+    global _SCENE, _FONT, _BG_SOURCE
+    _SCENE = scene
+    _FONT = load_font(FONT_SIZE * scene["scale"])
+    _BG_SOURCE = next((Image.open(p).convert("RGBA") for p in BACKGROUNDS if p.exists()), None)
+
+def background_tile(x0, y0, tw, th):
+    cw, ch = _SCENE["size"]
+    if _BG_SOURCE is not None:
+        sx, sy = _BG_SOURCE.width / cw, _BG_SOURCE.height / ch
+        return _BG_SOURCE.resize((tw, th), box=(x0 * sx, y0 * sy, (x0 + tw) * sx, (y0 + th) * sy))
+    cx, cy = cw//2, ch//2
     maxr = math.hypot(cx, cy)
-    px = bg.load()
-    for y in range(H):
-        for x in range(W):
+    data = []
+    for y in range(y0, y0 + th):
+        for x in range(x0, x0 + tw):
             r = math.hypot(x-cx, y-cy)
             v = int(235 - 190*(r/maxr))
             v = max(30, min(235, v))
-            px[x, y] = (v, v, v, 255)
+            data.append((v, v, v, 255))
+    bg = Image.new("RGBA", (tw, th), (20,20,20,255))
+    bg.putdata(data)
     return bg
 
-img = load_background()
-draw = ImageDraw.Draw(img)
+def render_tile(box):
+    """Draw the part of the scene inside box=(x0, y0, w, h); returns raw RGBA bytes."""
+    x0, y0, tw, th = box
+    s = _SCENE["scale"]
+    m = _SCENE["margin"]
+    img = Image.new("RGBA", (tw + m, th + m), (20,20,20,255))
+    img.paste(background_tile(x0, y0, tw, th), (m, m))
+    draw = ImageDraw.Draw(img)
+    x1, y1 = x0 + tw, y0 + th
+    x0, y0 = x0 - m, y0 - m   # drawing origin of img
 
-try:
-    font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", FONT_SIZE)
-except:
-    font = ImageFont.load_default()
+    dash, step = 6 * s, 12 * s
+    for y in _SCENE["lanes"]:
+        if y < y0 - s or y > y1 + s:
+            continue
+        start = int(LEFT_PAD * s)
+        first = start + max(0, (x0 - dash - start) // step) * step
+        for x in range(first, min(int((W - RIGHT_PAD) * s), x1 + 1), step):
+            draw.line([(x - x0, y - y0), (x + dash - x0, y - y0)], fill=(255, 255, 255, 60), width=max(1, s))
 
-PALETTE = [
-    (82, 186, 255), (140, 233, 154), (250, 176, 5), (255, 121, 97),
-    (110, 64, 170), (255, 214, 102), (84, 160, 255), (255, 99, 132),
-    (100, 181, 246), (255, 167, 38), (171, 71, 188)
-]
+    r = NODE_R * s
+    for x, y, color in _SCENE["circles"]:
+        if x + r < x0 - 2 * s or x - r > x1 + 2 * s or y + r < y0 - 2 * s or y - r > y1 + 2 * s:
+            continue
+        bbox = [x-r-x0, y-r-y0, x+r-x0, y+r-y0]
+        draw.ellipse(bbox, fill=(*color, 220), outline=(20,20,20,255), width=2 * s)
 
-for lane in sorted(set(n["group"] for n in nodes)):
-    y = TOP_PAD + lane * LANE_SPACING
-    for x in range(int(LEFT_PAD), int(W - RIGHT_PAD), 12):
-        draw.line([(x, y), (x + 6, y)], fill=(255, 255, 255, 60), width=1)
+    pad = _SCENE["text_h"]
+    for tx, ty, label in _SCENE["labels"]:
+        if ty > y1 + pad or ty + pad < y0 or tx > x1 + pad:
+            continue
+        tb = draw.textbbox((0,0), label, font=_FONT)
+        if tx + tb[2] + pad < x0:
+            continue
+        draw.text((tx+1-x0, ty+1-y0), label, font=_FONT, fill=(0,0,0,200))
+        draw.text((tx-x0, ty-y0), label, font=_FONT, fill=(255,255,255,255))
 
-for n in nodes:
-    x, y = n["x"], n["y"]
-    color = PALETTE[n["group"] % len(PALETTE)]
-    bbox = [x-NODE_R, y-NODE_R, x+NODE_R, y+NODE_R]
-    draw.ellipse(bbox, fill=(*color, 220), outline=(20,20,20,255), width=2)
-
-for i, n in enumerate(nodes):
-    x, y = n["x"], n["y"]
-    label = n["name"].replace(" (Reprise)", "")
-    tb = draw.textbbox((0,0), label, font=font)
-    tw, th = tb[2], tb[3]
-    dy = -NODE_R - 6 if (i % 2 == 0) else NODE_R + 6
-    tx, ty = x - tw/2, y + dy
-    draw.text((tx+1, ty+1), label, font=font, fill=(0,0,0,200))
-    draw.text((tx, ty), label, font=font, fill=(255,255,255,255))
-
-title = "Hamilton – Weighted Proximity (No Edges)"
-tb = draw.textbbox((0,0), title, font=font)
-draw.text((W/2 - tb[2]/2, 20), title, font=font, fill=(255,255,255,220))
-
-out = Path("/hamilton_layout_v2.png")
-img.save(out)
+    tx, ty, title = _SCENE["title"]
+    if y0 <= ty + pad and ty - pad <= y1:
+        draw.text((tx-x0, ty-y0), title, font=_FONT, fill=(255,255,255,220))
+    return img.crop((m, m, m + tw, m + th)).tobytes()
+
+class PNGStream:
+    """
+    Minimal RGBA PNG writer fed row bands top to bottom (no full-canvas buffer).
+    Writes to path + ".tmp"; close() moves the finished file into place, abort() drops it.
+    """
+    def __init__(self, path, width, height):
+        self.path = path
+        self.tmp = f"{path}.tmp"
+        self.f = open(self.tmp, "wb")
+        self.width = width
+        self.z = zlib.compressobj(6)
+        self.f.write(b"\x89PNG\r\n\x1a\n")
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+
+    def _chunk(self, tag, data):
+        self.f.write(struct.pack(">I", len(data)) + tag + data)
+        self.f.write(struct.pack(">I", zlib.crc32(tag + data) & 0xffffffff))
+
+    def write_rows(self, data):
+        row = self.width * 4
+        out = self.z.compress(b"".join(b"\x00" + data[k:k + row] for k in range(0, len(data), row)))
+        if out:
+            self._chunk(b"IDAT", out)
+
+    def close(self):
+        self._chunk(b"IDAT", self.z.flush())
+        self._chunk(b"IEND", b"")
+        self.f.close()
+        os.replace(self.tmp, self.path)
+
+    def abort(self):
+        self.f.close()
+        os.remove(self.tmp)
+
+def render(path=OUT_PATH, scale=RENDER_SCALE, tile=TILE, processes=RENDER_PROCESSES):
+    scene = build_scene(scale)
+    cw, ch = scene["size"]
+    boxes = [(x0, y0, min(tile, cw - x0), min(tile, ch - y0))
+             for y0 in range(0, ch, tile) for x0 in range(0, cw, tile)]
+    per_band = len(range(0, cw, tile))
+    out = PNGStream(path, cw, ch)
+    if processes > 1 and "fork" in get_all_start_methods():
+        pool = get_context("fork").Pool(processes, initializer=_init_tile_worker, initargs=(scene,))
+        tiles = pool.imap(render_tile, boxes)
+    else:
+        pool = None
+        _init_tile_worker(scene)
+        tiles = map(render_tile, boxes)
+    try:
+        band = []
+        for box, data in zip(boxes, tiles):
+            band.append((box, data))
+            if len(band) < per_band:
+                continue
+            th = band[0][0][3]
+            rows = []
+            for y in range(th):
+                for (_, _, tw, _), tile_data in band:
+                    rows.append(tile_data[y * tw * 4:(y + 1) * tw * 4])
+            out.write_rows(b"".join(rows))
+            band = []
+    except BaseException:
+        # leave any previous render at `path` untouched
+        out.abort()
+        if pool is not None:
+            pool.terminate()
+        raise
+    else:
+        out.close()
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return path
+
+out = render()
 print(f"Saved: {out}")
@@ -6,9 +6,13 @@ from Classes.Musical import Musical
 import json
 
 
-def read_and_load_musical():
+def read_and_load_musical(snapshot_path=None):
     with open("data/song_order.json", "r") as f:
         song_order = json.load(f)
+    if snapshot_path is not None:
+        # warm start: one read of the snapshot, rebuilding only changed songs
+        return Musical.load_snapshot(snapshot_path, base_dir='songs', song_order=song_order,
+                                     names=os.listdir('songs'))
     musical = Musical('songs', song_order=song_order)
     musical.load_songs(os.listdir('songs'))
     